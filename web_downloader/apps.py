@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Switch SQLite connections to WAL mode so progress reads don't block the
+    download workers' writes (and vice versa). Lock waits are handled by the
+    driver's busy timeout (DATABASES OPTIONS 'timeout').
+    """
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL;')
+            cursor.execute('PRAGMA synchronous=NORMAL;')
 
 
 class WebDownloaderConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'web_downloader'
+
+    def ready(self):
+        connection_created.connect(configure_sqlite, dispatch_uid='web_downloader.configure_sqlite')
@@ -1,5 +1,6 @@
 from django import forms
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from .models import VideoDownload
 from .helpers.downloader import YouTubeDownloader
 
@@ -52,3 +53,54 @@ class DownloadForm(forms.ModelForm):
             cleaned_data['quality'] = 'best'
         
         return cleaned_data
+
+
+class BatchDownloadForm(forms.Form):
+    """Form for starting downloads of several videos (e.g. a playlist selection)"""
+    
+    MAX_URLS = 500
+    
+    urls = forms.Field(widget=forms.MultipleHiddenInput)
+    format_type = forms.ChoiceField(choices=VideoDownload.FORMAT_CHOICES)
+    quality = forms.ChoiceField(choices=VideoDownload.QUALITY_CHOICES, required=False)
+    
+    def clean_urls(self):
+        """Validate every URL in the batch"""
+        urls = [url.strip() for url in self.cleaned_data.get('urls') or [] if url.strip()]
+        if not urls:
+            raise ValidationError('Please select at least one video')
+        if len(urls) > self.MAX_URLS:
+            raise ValidationError(f'At most {self.MAX_URLS} videos can be downloaded at once')
+        
+        for url in urls:
+            is_valid, error_message = YouTubeDownloader.validate_url(url)
+            if not is_valid:
+                raise ValidationError(f'{url}: {error_message}')
+        
+        return urls
+    
+    def clean(self):
+        """Additional form-level validation"""
+        cleaned_data = super().clean()
+        
+        # Same as DownloadForm: audio is always extracted at best quality
+        if cleaned_data.get('format_type') == 'mp3':
+            cleaned_data['quality'] = 'best'
+        elif not cleaned_data.get('quality'):
+            cleaned_data['quality'] = YouTubeDownloader.DEFAULT_QUALITY
+        
+        return cleaned_data
+    
+    def save_many(self, session_id):
+        """Create one pending download per URL with a single batched INSERT"""
+        downloads = [
+            VideoDownload(
+                url=url,
+                format_type=self.cleaned_data['format_type'],
+                quality=self.cleaned_data['quality'],
+                session_id=session_id,
+            )
+            for url in self.cleaned_data['urls']
+        ]
+        with transaction.atomic():
+            return VideoDownload.objects.bulk_create(downloads, batch_size=500)
@@ -6,22 +6,152 @@ using yt-dlp with fallback mechanisms for handling various edge cases
 including signature-cipher issues and age-restricted videos.
 """
 
-import json
+import hashlib
 import os
+import queue
 import re
 import shutil
-import sys
-import subprocess
 import tempfile
+import threading
+import time
 import logging
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, Dict, Any, Tuple
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Iterable, Iterator, List, Tuple
+
+from django.core.cache import caches
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadError
 
 logger = logging.getLogger(__name__)
 
 # Path to cookies file (can be set via environment variable)
 COOKIES_FILE = os.environ.get('YOUTUBE_COOKIES_FILE', '/app/cookies/cookies.txt')
 
+# Parent directory for temporary download directories. Point this at local
+# disk (not a network mount); defaults to the system temp directory.
+TEMP_DIR = os.environ.get('YTDL_TEMP_DIR') or None
+
+# Number of DASH/HLS fragments fetched in parallel per download
+CONCURRENT_FRAGMENTS = int(os.environ.get('YTDL_CONCURRENT_FRAGMENTS', '4'))
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# YoutubeDL options shared by metadata lookups and downloads
+_COMMON_YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'noplaylist': True,  # Don't process the whole playlist if URL contains one
+    # User agent to avoid bot detection
+    'http_headers': {'User-Agent': USER_AGENT},
+    # Use multiple player clients for better compatibility
+    'extractor_args': {'youtube': {'player_client': ['android', 'web']}},
+}
+
+# Additional options for every download
+_DOWNLOAD_YDL_OPTS = {
+    **_COMMON_YDL_OPTS,
+    'restrictfilenames': True,
+    'noprogress': True,
+    'nocheckcertificate': True,
+    # Fetch DASH/HLS fragments in parallel
+    'concurrent_fragment_downloads': CONCURRENT_FRAGMENTS,
+    # Request large ranges to work around per-connection throttling
+    'http_chunk_size': 10 * 1024 * 1024,
+    # Read/write in 64 KiB blocks to cut syscalls and file fragmentation
+    'buffersize': 64 * 1024,
+    'retries': 10,
+    'fragment_retries': 10,
+}
+
+# Video metadata is cached per video ID in the 'video_info' cache (see settings.CACHES)
+VIDEO_INFO_CACHE_ALIAS = 'video_info'
+VIDEO_INFO_TTL = 24 * 60 * 60
+
+# Playlists change more often than videos, so their listings are kept briefly
+PLAYLIST_INFO_TTL = 5 * 60
+
+# Minimum seconds between progress callbacks (~5 Hz)
+PROGRESS_INTERVAL = 0.2
+
+# Lookups currently fetching metadata, by video ID; concurrent requests for the
+# same video wait on the first one instead of hitting YouTube again
+_INFLIGHT: Dict[str, Future] = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+# Maximum seconds to wait on another request's lookup of the same video
+INFLIGHT_TIMEOUT = 60
+
+# Number of YoutubeDL instances kept for reuse by metadata lookups
+YDL_POOL_SIZE = int(os.environ.get('YTDL_POOL_SIZE', '8'))
+
+# Idle metadata YoutubeDL instances, each with the cookie file version it
+# loaded (see _cookie_version), and the slots bounding how many exist
+_YDL_POOL: 'queue.SimpleQueue[Tuple[Optional[float], YoutubeDL]]' = queue.SimpleQueue()
+_YDL_SLOTS = threading.BoundedSemaphore(YDL_POOL_SIZE)
+
+# Process-wide downloader used for metadata lookups (see get_info_downloader)
+_INFO_DOWNLOADER: Optional['YouTubeDownloader'] = None
+_INFO_DOWNLOADER_LOCK = threading.Lock()
+
+
+def _cookie_opts() -> Dict[str, Any]:
+    """Return the cookiefile option if a cookies file is available."""
+    if os.path.exists(COOKIES_FILE):
+        logger.debug(f"Using cookies file: {COOKIES_FILE}")
+        return {'cookiefile': COOKIES_FILE}
+    return {}
+
+
+def _cookie_version() -> Optional[float]:
+    """Return the cookies file's modification time, or None if there is none."""
+    try:
+        return os.stat(COOKIES_FILE).st_mtime
+    except OSError:
+        return None
+
+
+def _discard_ydl(ydl: YoutubeDL):
+    """Close a pooled YoutubeDL without writing its stale cookie jar back to disk."""
+    ydl.params['cookiefile'] = None
+    try:
+        ydl.close()
+    except Exception as e:
+        logger.debug(f"Error closing YoutubeDL instance: {e}")
+
+
+@contextmanager
+def _metadata_ydl() -> Iterator[YoutubeDL]:
+    """
+    Check out a shared YoutubeDL instance for metadata extraction.
+
+    Instances are created lazily, up to YDL_POOL_SIZE, and returned to the
+    pool afterwards so extractor setup, the cookie jar and open HTTP
+    connections are reused across lookups. Each instance is used by one
+    thread at a time.
+
+    An instance only reads the cookies file when created, so instances
+    are replaced once the file changes (e.g. after export_firefox_cookies.py).
+    """
+    with _YDL_SLOTS:
+        version = _cookie_version()
+        try:
+            ydl_version, ydl = _YDL_POOL.get_nowait()
+        except queue.Empty:
+            ydl = None
+        else:
+            if ydl_version != version:
+                _discard_ydl(ydl)
+                ydl = None
+        if ydl is None:
+            ydl = YoutubeDL({**_COMMON_YDL_OPTS, 'skip_download': True, **_cookie_opts()})
+        try:
+            yield ydl
+        finally:
+            _YDL_POOL.put((version, ydl))
+
 
 class YouTubeDownloader:
     """
@@ -29,35 +159,60 @@ class YouTubeDownloader:
     including video (MP4) and audio (MP3) formats with proper error handling.
     """
 
-    # Quality format mappings for yt-dlp
-    VIDEO_QUALITY_FORMATS = {
+    # Quality format mappings for yt-dlp (read-only; shared by every instance)
+    VIDEO_QUALITY_FORMATS = MappingProxyType({
         'best': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
         '1080p': 'bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[height<=1080][ext=mp4]/best[height<=1080]',
         '720p': 'bestvideo[height<=720][ext=mp4]+bestaudio[ext=m4a]/best[height<=720][ext=mp4]/best[height<=720]',
         '480p': 'bestvideo[height<=480][ext=mp4]+bestaudio[ext=m4a]/best[height<=480][ext=mp4]/best[height<=480]',
         'worst': 'worstvideo[ext=mp4]+worstaudio[ext=m4a]/worst[ext=mp4]/worst',
-    }
+    })
+
+    # Used when a requested quality has no mapping
+    DEFAULT_QUALITY = '720p'
 
     AUDIO_FORMAT = 'bestaudio[ext=m4a]/bestaudio/best'
 
-    # Regex pattern for validating YouTube URLs
+    # Cheap substring check run before the regex; every valid URL contains one of these
+    _HOST_HINTS = ('youtube.com/', 'youtu.be/')
+
+    # Regex pattern for validating YouTube URLs; also captures the video ID
+    # (when present) so validation and extraction take a single match
     YOUTUBE_URL_PATTERN = re.compile(
-        r'^(https?://)?(www\.)?(youtube\.com/(watch\?v=|embed/|v/|shorts/)|youtu\.be/|youtube\.com/playlist\?list=)[\w\-&=]+',
-        re.IGNORECASE
+        r'\A(https?://)?(www\.)?((youtube\.com/(watch\?v=|embed/|v/|shorts/)|youtu\.be/)(?=(?P<video_id>[\w-]{11})|)'
+        r'|youtube\.com/playlist\?list=)[\w\-&=]+',
+        re.IGNORECASE | re.ASCII
     )
 
+    # Finds a video ID anywhere in a URL
+    VIDEO_ID_PATTERN = re.compile(r'(?:v=|/v/|youtu\.be/|embed/|shorts/)(?P<video_id>[a-zA-Z0-9_-]{11})')
+
+    # Finds a playlist ID in a URL's query string
+    PLAYLIST_ID_PATTERN = re.compile(r'[?&]list=(?P<playlist_id>[a-zA-Z0-9_-]+)')
+
+    # Written into a download directory once yt-dlp has finished (merging and
+    # post-processing included); holds the name of the finished file
+    COMPLETE_MARKER = '.complete'
+
     def __init__(self, output_dir: Optional[str] = None):
         """
         Initialize the downloader.
 
         Args:
-            output_dir: Directory to save downloaded files. Uses tempdir if not specified.
+            output_dir: Directory to save downloaded files. Uses a temp directory,
+                created on first use, if not specified.
         """
+        self._output_dir: Optional[Path] = None
         if output_dir:
-            self.output_dir = Path(output_dir)
-            self.output_dir.mkdir(parents=True, exist_ok=True)
-        else:
-            self.output_dir = Path(tempfile.mkdtemp(prefix='yt_download_'))
+            self._output_dir = Path(output_dir)
+            self._output_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def output_dir(self) -> Path:
+        """Directory downloads are saved to; metadata lookups never create it."""
+        if self._output_dir is None:
+            self._output_dir = Path(tempfile.mkdtemp(prefix='yt_download_', dir=TEMP_DIR))
+        return self._output_dir
 
     @classmethod
     def validate_url(cls, url: str) -> Tuple[bool, str]:
@@ -70,19 +225,40 @@ class YouTubeDownloader:
         Returns:
             Tuple of (is_valid, error_message)
         """
+        is_valid, _, error_message = cls.validate_and_extract(url)
+        return is_valid, error_message
+
+    @classmethod
+    def validate_and_extract(cls, url: str) -> Tuple[bool, Optional[str], str]:
+        """
+        Validate a YouTube URL and extract its video ID in one pass.
+
+        Args:
+            url: The URL to validate
+
+        Returns:
+            Tuple of (is_valid, video_id, error_message); video_id is None
+            for invalid URLs and for URLs without one (e.g. playlists)
+        """
         if not url:
-            return False, "URL cannot be empty"
+            return False, None, "URL cannot be empty"
 
         url = url.strip()
 
-        if not cls.YOUTUBE_URL_PATTERN.match(url):
-            return False, "Invalid YouTube URL format"
-
-        # Additional validation for common issues
+        # Bound the input before doing any matching work
         if len(url) > 500:
-            return False, "URL is too long"
+            return False, None, "URL is too long"
+
+        # Reject obvious non-YouTube input without running the regex
+        lowered = url.lower()
+        if not any(hint in lowered for hint in cls._HOST_HINTS):
+            return False, None, "Invalid YouTube URL format"
+
+        match = cls.YOUTUBE_URL_PATTERN.match(url)
+        if not match:
+            return False, None, "Invalid YouTube URL format"
 
-        return True, ""
+        return True, match.group('video_id'), ""
 
     @classmethod
     def extract_video_id(cls, url: str) -> Optional[str]:
@@ -95,13 +271,9 @@ class YouTubeDownloader:
         Returns:
             Video ID or None if not found
         """
-        patterns = [
-            r'(?:v=|/v/|youtu\.be/|embed/|shorts/)([a-zA-Z0-9_-]{11})',
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, url)
-            if match:
-                return match.group(1)
+        match = cls.VIDEO_ID_PATTERN.search(url)
+        if match:
+            return match.group('video_id')
         return None
 
     @classmethod
@@ -115,9 +287,9 @@ class YouTubeDownloader:
         Returns:
             Playlist ID or None if not found
         """
-        match = re.search(r'[?&]list=([a-zA-Z0-9_-]+)', url)
+        match = cls.PLAYLIST_ID_PATTERN.search(url)
         if match:
-            return match.group(1)
+            return match.group('playlist_id')
         return None
 
     @classmethod
@@ -133,188 +305,217 @@ class YouTubeDownloader:
         """
         return cls.extract_playlist_id(url) is not None
 
+    @staticmethod
+    def _playlist_cache_key(playlist_id: str) -> str:
+        """Cache key for a playlist listing in the 'video_info' cache."""
+        return f'playlist:{playlist_id}'
+
+    @classmethod
+    def invalidate_playlist(cls, playlist_id: str):
+        """
+        Drop a cached playlist listing so the next lookup refetches it.
+
+        Args:
+            playlist_id: YouTube playlist ID
+        """
+        caches[VIDEO_INFO_CACHE_ALIAS].delete(cls._playlist_cache_key(playlist_id))
+
     def get_playlist_info(self, url: str) -> Optional[Dict[str, Any]]:
         """
         Fetch metadata for a YouTube playlist without downloading.
 
+        Results are cached by playlist ID for PLAYLIST_INFO_TTL seconds.
+
         Args:
             url: YouTube playlist URL
 
         Returns:
             Dictionary with playlist metadata or None on failure
         """
-        cmd = [
-            sys.executable, '-m', 'yt_dlp',
-            '--dump-json',
-            '--flat-playlist',
-            '--no-download',
-            '--no-warnings',
-            '--user-agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-        ]
-        
-        # Add cookies if available
-        if os.path.exists(COOKIES_FILE):
-            cmd.extend(['--cookies', COOKIES_FILE])
-        
-        cmd.append(url)
+        playlist_id = self.extract_playlist_id(url)
+        cache = caches[VIDEO_INFO_CACHE_ALIAS]
 
-        try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=180  # Playlists can take longer
-            )
-
-            if result.returncode == 0 and result.stdout.strip():
-                lines = result.stdout.strip().split('\n')
-                videos = []
-                playlist_title = "Unknown Playlist"
-                playlist_uploader = "Unknown"
-                playlist_id = self.extract_playlist_id(url)
-                
-                for line in lines:
-                    try:
-                        data = json.loads(line)
-                        # Check if this is playlist metadata or video entry
-                        if data.get('_type') == 'playlist':
-                            playlist_title = data.get('title', playlist_title)
-                            playlist_uploader = data.get('uploader', playlist_uploader)
-                        else:
-                            # This is a video entry
-                            video_id = data.get('id', '')
-                            duration = data.get('duration', 0) or 0
-                            
-                            # Format duration
-                            if duration:
-                                hours, remainder = divmod(int(duration), 3600)
-                                minutes, seconds = divmod(remainder, 60)
-                                if hours:
-                                    duration_formatted = f"{hours}:{minutes:02d}:{seconds:02d}"
-                                else:
-                                    duration_formatted = f"{minutes}:{seconds:02d}"
-                            else:
-                                duration_formatted = "N/A"
-                            
-                            videos.append({
-                                'id': video_id,
-                                'title': data.get('title', 'Unknown'),
-                                'url': f"https://www.youtube.com/watch?v={video_id}",
-                                'thumbnail': data.get('thumbnail') or f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
-                                'duration': duration,
-                                'duration_formatted': duration_formatted,
-                                'uploader': data.get('uploader', ''),
-                            })
-                    except json.JSONDecodeError:
-                        continue
-                
-                if videos:
-                    # Calculate total duration
-                    total_duration = sum(v.get('duration', 0) or 0 for v in videos)
-                    hours, remainder = divmod(int(total_duration), 3600)
-                    minutes, seconds = divmod(remainder, 60)
-                    if hours:
-                        total_duration_formatted = f"{hours}:{minutes:02d}:{seconds:02d}"
-                    else:
-                        total_duration_formatted = f"{minutes}:{seconds:02d}"
-                    
-                    return {
-                        'is_playlist': True,
-                        'playlist_id': playlist_id,
-                        'title': playlist_title,
-                        'uploader': playlist_uploader,
-                        'video_count': len(videos),
-                        'total_duration': total_duration,
-                        'total_duration_formatted': total_duration_formatted,
-                        'thumbnail': videos[0]['thumbnail'] if videos else None,
-                        'videos': videos,
-                    }
-                else:
-                    logger.error("No videos found in playlist")
-                    return None
-            else:
-                logger.error(f"Failed to fetch playlist info: {result.stderr}")
-                return None
+        if playlist_id:
+            info = cache.get(self._playlist_cache_key(playlist_id))
+            if info is not None:
+                return info
+
+        info = self._extract_playlist(url)
+        if info and playlist_id:
+            cache.set(self._playlist_cache_key(playlist_id), info, PLAYLIST_INFO_TTL)
+        return info
+
+    def _extract_playlist(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Extract playlist metadata from YouTube, bypassing the cache.
+
+        Args:
+            url: YouTube playlist URL
+
+        Returns:
+            Dictionary with playlist metadata or None on failure
+        """
+        # Flat extraction lists the entries without resolving each video
+        ydl_opts = {
+            **_COMMON_YDL_OPTS,
+            'noplaylist': False,
+            'extract_flat': 'in_playlist',
+            'skip_download': True,
+            **_cookie_opts(),
+        }
 
-        except subprocess.TimeoutExpired:
-            logger.error("Timeout while fetching playlist info")
+        try:
+            with YoutubeDL(ydl_opts) as ydl:
+                data = ydl.extract_info(url, download=False)
+        except DownloadError as e:
+            logger.error(f"Failed to fetch playlist info: {e}")
             return None
         except Exception as e:
             logger.error(f"Error fetching playlist info: {e}")
             return None
 
-    def get_video_info(self, url: str) -> Optional[Dict[str, Any]]:
+        if not data:
+            logger.error("Failed to fetch playlist info: no data returned")
+            return None
+
+        videos = []
+        for entry in data.get('entries') or ():
+            if not entry:
+                continue
+            video_id = entry.get('id', '')
+            duration = entry.get('duration', 0) or 0
+            videos.append({
+                'id': video_id,
+                'title': entry.get('title', 'Unknown'),
+                'url': f"https://www.youtube.com/watch?v={video_id}",
+                'thumbnail': entry.get('thumbnail') or f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+                'duration': duration,
+                'duration_formatted': format_duration(int(duration)) if duration else "N/A",
+                'uploader': entry.get('uploader', ''),
+            })
+
+        if not videos:
+            logger.error("No videos found in playlist")
+            return None
+
+        total_duration = sum(v['duration'] for v in videos)
+
+        return {
+            'is_playlist': True,
+            'playlist_id': self.extract_playlist_id(url),
+            'title': data.get('title') or "Unknown Playlist",
+            'uploader': data.get('uploader') or data.get('channel') or "Unknown",
+            'video_count': len(videos),
+            'total_duration': total_duration,
+            'total_duration_formatted': format_duration(int(total_duration)),
+            'thumbnail': videos[0]['thumbnail'],
+            'videos': videos,
+        }
+
+    @classmethod
+    def invalidate(cls, video_id: str):
+        """
+        Drop cached metadata for a video so the next lookup refetches it.
+
+        Args:
+            video_id: YouTube video ID
+        """
+        caches[VIDEO_INFO_CACHE_ALIAS].delete(video_id)
+
+    def get_video_info(self, url: str, video_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """
         Fetch metadata for a YouTube video without downloading.
 
+        Results are cached by video ID for VIDEO_INFO_TTL seconds. Concurrent
+        lookups of the same uncached video share a single extraction.
+
         Args:
             url: YouTube video URL
+            video_id: Video ID if already known (e.g. from validate_and_extract)
 
         Returns:
             Dictionary with video metadata or None on failure
         """
-        cmd = [
-            sys.executable, '-m', 'yt_dlp',
-            '--dump-json',
-            '--no-download',
-            '--no-warnings',
-            '--no-playlist',
-            '--user-agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            '--extractor-args', 'youtube:player_client=android,web',
-        ]
-        
-        # Add cookies if available
-        if os.path.exists(COOKIES_FILE):
-            cmd.extend(['--cookies', COOKIES_FILE])
-            logger.debug(f"Using cookies file: {COOKIES_FILE}")
-        
-        cmd.append(url)
+        video_id = video_id or self.extract_video_id(url)
+        cache = caches[VIDEO_INFO_CACHE_ALIAS]
+
+        if not video_id:
+            return self._extract_sync(url)
+
+        info = cache.get(video_id)
+        if info is not None:
+            return info
+
+        with _INFLIGHT_LOCK:
+            future = _INFLIGHT.get(video_id)
+            is_leader = future is None
+            if is_leader:
+                future = _INFLIGHT[video_id] = Future()
+
+        if not is_leader:
+            try:
+                return future.result(timeout=INFLIGHT_TIMEOUT)
+            except FutureTimeoutError:
+                logger.warning(f"Timed out waiting for video info: {video_id}")
+                return None
 
+        info = None
         try:
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=120
-            )
-
-            if result.returncode == 0 and result.stdout.strip():
-                data = json.loads(result.stdout.strip().split('\n')[0])
-                
-                # Format duration for display
-                duration = data.get('duration', 0) or 0
-                hours, remainder = divmod(int(duration), 3600)
-                minutes, seconds = divmod(remainder, 60)
-                if hours:
-                    duration_formatted = f"{hours}:{minutes:02d}:{seconds:02d}"
-                else:
-                    duration_formatted = f"{minutes}:{seconds:02d}"
-                
-                return {
-                    'title': data.get('title', 'Unknown'),
-                    'thumbnail': data.get('thumbnail'),
-                    'duration': duration,
-                    'duration_string': data.get('duration_string', '0:00'),
-                    'duration_formatted': duration_formatted,
-                    'description': data.get('description', ''),
-                    'uploader': data.get('uploader', 'Unknown'),
-                    'channel': data.get('channel') or data.get('uploader', 'Unknown'),
-                    'view_count': data.get('view_count', 0),
-                    'upload_date': data.get('upload_date', ''),
-                    'webpage_url': data.get('webpage_url', url),
-                    'id': data.get('id', ''),
-                    'age_limit': data.get('age_limit', 0),
-                    'is_live': data.get('is_live', False),
-                }
-            else:
-                logger.error(f"Failed to fetch video info: {result.stderr}")
+            info = self._extract_sync(url)
+            if info:
+                cache.set(video_id, info, VIDEO_INFO_TTL)
+        finally:
+            with _INFLIGHT_LOCK:
+                _INFLIGHT.pop(video_id, None)
+            future.set_result(info)
+        return info
+
+    def _extract_sync(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Extract video metadata from YouTube, bypassing the cache.
+
+        Args:
+            url: YouTube video URL
+
+        Returns:
+            Dictionary with video metadata or None on failure
+        """
+        try:
+            with _metadata_ydl() as ydl:
+                data = ydl.extract_info(url, download=False)
+
+            if not data:
+                logger.error("Failed to fetch video info: no data returned")
                 return None
 
-        except subprocess.TimeoutExpired:
-            logger.error("Timeout while fetching video info")
-            return None
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error: {e}")
+            # Format duration for display
+            duration = data.get('duration', 0) or 0
+            hours, remainder = divmod(int(duration), 3600)
+            minutes, seconds = divmod(remainder, 60)
+            if hours:
+                duration_formatted = f"{hours}:{minutes:02d}:{seconds:02d}"
+            else:
+                duration_formatted = f"{minutes}:{seconds:02d}"
+
+            return {
+                'title': data.get('title', 'Unknown'),
+                'thumbnail': data.get('thumbnail'),
+                'duration': duration,
+                'duration_string': data.get('duration_string', '0:00'),
+                'duration_formatted': duration_formatted,
+                'description': data.get('description', ''),
+                'uploader': data.get('uploader', 'Unknown'),
+                'channel': data.get('channel') or data.get('uploader', 'Unknown'),
+                'view_count': data.get('view_count', 0),
+                'upload_date': data.get('upload_date', ''),
+                'webpage_url': data.get('webpage_url', url),
+                'id': data.get('id', ''),
+                'age_limit': data.get('age_limit', 0),
+                'is_live': data.get('is_live', False),
+            }
+
+        except DownloadError as e:
+            logger.error(f"Failed to fetch video info: {e}")
             return None
         except Exception as e:
             logger.error(f"Error fetching video info: {e}")
@@ -337,12 +538,19 @@ class YouTubeDownloader:
         Returns:
             Tuple of (success, message, file_path)
         """
-        format_string = self.VIDEO_QUALITY_FORMATS.get(quality, self.VIDEO_QUALITY_FORMATS['720p'])
-        output_template = str(self.output_dir / '%(title)s.%(ext)s')
+        if quality not in self.VIDEO_QUALITY_FORMATS:
+            quality = self.DEFAULT_QUALITY
+
+        cached = self._cached_result(url, quality, 'mp4', progress_callback)
+        if cached:
+            return cached
+
+        format_string = self.VIDEO_QUALITY_FORMATS[quality]
+        output_template = str(self._output_dir_for(url, quality, 'mp4') / '%(title)s.%(ext)s')
 
-        cmd = self._build_download_command(url, format_string, output_template, 'mp4')
+        ydl_opts = self._build_download_options(format_string, output_template, 'mp4')
 
-        return self._execute_download(cmd, progress_callback)
+        return self._execute_download(url, ydl_opts, progress_callback)
 
     def download_audio(
         self,
@@ -359,158 +567,220 @@ class YouTubeDownloader:
         Returns:
             Tuple of (success, message, file_path)
         """
-        output_template = str(self.output_dir / '%(title)s.%(ext)s')
-
-        cmd = [
-            sys.executable, '-m', 'yt_dlp',
-            '-f', self.AUDIO_FORMAT,
-            '-x',  # Extract audio
-            '--audio-format', 'mp3',
-            '--audio-quality', '0',  # Best quality
-            '-o', output_template,
-            '--newline',
-            '--progress',
-            '--restrict-filenames',
-            '--user-agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            '--extractor-args', 'youtube:player_client=android,web',
-            '--no-check-certificate',
-            '--no-playlist',
-        ]
-        
-        # Add cookies if available
-        if os.path.exists(COOKIES_FILE):
-            cmd.extend(['--cookies', COOKIES_FILE])
-        
-        cmd.append(url)
-
-        return self._execute_download(cmd, progress_callback)
-
-    def _build_download_command(
+        cached = self._cached_result(url, 'best', 'mp3', progress_callback)
+        if cached:
+            return cached
+
+        output_template = str(self._output_dir_for(url, 'best', 'mp3') / '%(title)s.%(ext)s')
+
+        ydl_opts = self._build_download_options(self.AUDIO_FORMAT, output_template, merge_format=None)
+        # Extract audio at best quality
+        ydl_opts['postprocessors'] = [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '0',
+        }]
+
+        return self._execute_download(url, ydl_opts, progress_callback)
+
+    def _output_dir_for(self, url: str, quality: str, format_type: str) -> Path:
+        """
+        Get the directory a (video, quality, format) download is written to.
+
+        Each combination gets its own subdirectory so a finished file can be
+        found again without a network round trip.
+
+        Args:
+            url: YouTube video URL
+            quality: Video quality
+            format_type: 'mp4' or 'mp3'
+
+        Returns:
+            Path of the directory for this download
+        """
+        video_id = self.extract_video_id(url) or url
+        key = hashlib.sha1(f"{video_id}|{quality}|{format_type}".encode()).hexdigest()
+        return self.output_dir / key
+
+    def _cached_result(
         self,
         url: str,
+        quality: str,
+        format_type: str,
+        progress_callback: Optional[callable] = None
+    ) -> Optional[Tuple[bool, str, Optional[str]]]:
+        """
+        Return a previously finished download for this request, if any.
+
+        Args:
+            url: YouTube video URL
+            quality: Video quality
+            format_type: 'mp4' or 'mp3'
+            progress_callback: Optional callback, told 100% on a cache hit
+
+        Returns:
+            Tuple of (success, message, file_path), or None on a cache miss
+        """
+        directory = self._output_dir_for(url, quality, format_type)
+        # Without the marker the directory may only hold partial output
+        # (.part/.temp files, unmerged streams, audio awaiting conversion)
+        try:
+            name = (directory / self.COMPLETE_MARKER).read_text().strip()
+        except OSError:
+            return None
+
+        # The file may have been evicted since (see enforce_size_limit)
+        file_path = directory / name
+        if not name or not file_path.is_file():
+            return None
+
+        # Mark it recently used for enforce_size_limit; reads alone don't
+        # (noatime/relatime mounts, or the proxy serving the file)
+        try:
+            os.utime(file_path)
+            os.utime(directory / self.COMPLETE_MARKER)
+        except OSError as e:
+            logger.warning(f"Could not refresh timestamps of {file_path}: {e}")
+
+        if progress_callback:
+            progress_callback(100, file_path.stem)
+        return True, "File already downloaded", str(file_path)
+
+    @classmethod
+    def _mark_complete(cls, file_path: Path):
+        """
+        Record file_path as the finished result of its download directory.
+
+        Args:
+            file_path: Path of the finished file
+        """
+        marker = file_path.parent / cls.COMPLETE_MARKER
+        tmp_marker = marker.with_name(f'{marker.name}.tmp')
+        tmp_marker.write_text(file_path.name)
+        os.replace(tmp_marker, marker)
+
+    def _build_download_options(
+        self,
         format_string: str,
         output_template: str,
-        merge_format: str = 'mp4'
-    ) -> list:
+        merge_format: Optional[str] = 'mp4'
+    ) -> Dict[str, Any]:
         """
-        Build the yt-dlp command with optimal settings.
+        Build the YoutubeDL options with optimal settings.
 
         Args:
-            url: YouTube URL
             format_string: yt-dlp format string
             output_template: Output file path template
-            merge_format: Output container format
+            merge_format: Output container format, or None to skip merging
+
+        Returns:
+            Dictionary of YoutubeDL options
+        """
+        ydl_opts = {
+            **_DOWNLOAD_YDL_OPTS,
+            'format': format_string,
+            'outtmpl': output_template,
+            **_cookie_opts(),
+        }
+        if merge_format:
+            ydl_opts['merge_output_format'] = merge_format
+
+        return ydl_opts
+
+    @staticmethod
+    def _parse_percent(status: Dict[str, Any]) -> Optional[float]:
+        """
+        Read the download percentage from a yt-dlp progress hook payload.
+
+        Uses the numeric byte counters (or, for fragmented streams without a
+        size estimate, the fragment counters) rather than the formatted
+        '_percent_str', so no string parsing happens per block.
+
+        Args:
+            status: Progress dictionary passed to the hook
 
         Returns:
-            List of command arguments
-        """
-        cmd = [
-            sys.executable, '-m', 'yt_dlp',
-            '-f', format_string,
-            '--merge-output-format', merge_format,
-            '-o', output_template,
-            '--newline',
-            '--progress',
-            '--restrict-filenames',
-            # User agent to avoid bot detection
-            '--user-agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            # Use multiple player clients for better compatibility
-            '--extractor-args', 'youtube:player_client=android,web',
-            '--no-check-certificate',
-            '--no-playlist',  # Don't download entire playlist if URL contains playlist
-        ]
-        
-        # Add cookies if available
-        if os.path.exists(COOKIES_FILE):
-            cmd.extend(['--cookies', COOKIES_FILE])
-        
-        cmd.append(url)
-
-        return cmd
+            Percentage (0-100) or None if it cannot be determined
+        """
+        downloaded = status.get('downloaded_bytes')
+        total = status.get('total_bytes') or status.get('total_bytes_estimate')
+        if downloaded is not None and total:
+            return min(downloaded * 100 / total, 100.0)
+
+        fragment_index = status.get('fragment_index')
+        fragment_count = status.get('fragment_count')
+        if fragment_index is not None and fragment_count:
+            return min(fragment_index * 100 / fragment_count, 100.0)
+        return None
 
     def _execute_download(
         self,
-        cmd: list,
+        url: str,
+        ydl_opts: Dict[str, Any],
         progress_callback: Optional[callable] = None
     ) -> Tuple[bool, str, Optional[str]]:
         """
-        Execute the download command and handle progress.
+        Run the download in-process and handle progress.
 
         Args:
-            cmd: Command to execute
+            url: YouTube URL
+            ydl_opts: YoutubeDL options for this download
             progress_callback: Optional callback for progress updates
 
         Returns:
             Tuple of (success, message, file_path)
         """
+        state = {'file': None, 'title': '', 'percent': -1, 'reported_at': 0.0}
+
+        def progress_hook(d: Dict[str, Any]):
+            filename = d.get('filename')
+            if filename and filename != state['file']:
+                state['file'] = filename
+                state['title'] = Path(filename).stem
+
+            if d.get('status') != 'downloading' or not progress_callback:
+                return
+
+            percent = self._parse_percent(d)
+            if percent is None:
+                return
+
+            # yt-dlp fires the hook for every received block; only report
+            # whole-percent changes, at most every PROGRESS_INTERVAL seconds
+            percent = int(percent)
+            now = time.monotonic()
+            if percent == state['percent']:
+                return
+            if percent < 100 and now - state['reported_at'] < PROGRESS_INTERVAL:
+                return
+
+            state['percent'] = percent
+            state['reported_at'] = now
+            progress_callback(percent, state['title'])
+
         try:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1
-            )
-
-            current_file = None
-            current_title = ""
-
-            for line in process.stdout:
-                line = line.strip()
-
-                # Extract destination file path
-                if '[download]' in line and 'Destination:' in line:
-                    dest = line.split('Destination:')[-1].strip()
-                    current_file = dest
-                    current_title = Path(dest).stem
-
-                # Extract progress percentage
-                elif '[download]' in line and '%' in line:
-                    try:
-                        percent_str = line.split('%')[0].split()[-1]
-                        percent = float(percent_str)
-                        if progress_callback:
-                            progress_callback(int(percent), current_title)
-                    except (ValueError, IndexError):
-                        pass
-
-                # Look for merger output (final file)
-                elif '[Merger]' in line and 'Merging formats into' in line:
-                    merged_file = line.split('"')[-2] if '"' in line else None
-                    if merged_file:
-                        current_file = merged_file
-
-                # Look for ExtractAudio output
-                elif '[ExtractAudio]' in line and 'Destination:' in line:
-                    dest = line.split('Destination:')[-1].strip()
-                    current_file = dest
-
-            process.wait()
-
-            if process.returncode == 0:
-                # Try to find the downloaded file
-                if current_file and Path(current_file).exists():
-                    return True, "Download completed successfully", current_file
-
-                # Fallback: search for the most recent file
-                if current_title:
-                    possible_files = list(self.output_dir.glob(f"{current_title}.*"))
-                    if possible_files:
-                        # Get the most recently modified file
-                        latest_file = max(possible_files, key=lambda f: f.stat().st_mtime)
-                        return True, "Download completed successfully", str(latest_file)
-
-                # Last resort: find any recent file
-                all_files = sorted(self.output_dir.iterdir(), key=lambda f: f.stat().st_mtime, reverse=True)
-                if all_files:
-                    return True, "Download completed successfully", str(all_files[0])
-
-                return False, "Download completed but file not found", None
-            else:
+            with YoutubeDL({**ydl_opts, 'progress_hooks': [progress_hook]}) as ydl:
+                info = ydl.extract_info(url, download=True)
+
+            if not info:
                 return False, "Download failed", None
 
-        except subprocess.TimeoutExpired:
-            return False, "Download timed out", None
+            # yt-dlp records where each requested download ended up after
+            # merging, post-processing and moving (what --print after_move:filepath shows)
+            requested = info.get('requested_downloads') or [info]
+            file_path = requested[-1].get('filepath')
+            if file_path and Path(file_path).exists():
+                try:
+                    self._mark_complete(Path(file_path))
+                except OSError as e:
+                    logger.error(f"Error marking download complete: {e}")
+                return True, "Download completed successfully", file_path
+
+            return False, "Download completed but file not found", None
+
+        except DownloadError as e:
+            logger.error(f"Download failed: {e}")
+            return False, "Download failed", None
         except Exception as e:
             logger.exception(f"Download error: {e}")
             return False, f"Download error: {str(e)}", None
@@ -527,13 +797,126 @@ class YouTubeDownloader:
                 path = Path(file_path)
                 if path.exists():
                     path.unlink()
-            elif self.output_dir.exists() and str(self.output_dir).startswith(tempfile.gettempdir()):
+            elif (self._output_dir and self._output_dir.exists()
+                  and str(self._output_dir).startswith(TEMP_DIR or tempfile.gettempdir())):
                 # Only delete if it's a temp directory we created
-                shutil.rmtree(self.output_dir, ignore_errors=True)
+                shutil.rmtree(self._output_dir, ignore_errors=True)
         except Exception as e:
             logger.error(f"Cleanup error: {e}")
 
 
+def get_info_downloader() -> YouTubeDownloader:
+    """
+    Return the shared downloader used for metadata lookups.
+
+    Lookups keep no per-request state, so one lazily created instance serves
+    every request. It never downloads, so its temporary output directory is
+    never created. Downloads still use their own instances.
+
+    Returns:
+        The process-wide YouTubeDownloader
+    """
+    global _INFO_DOWNLOADER
+    if _INFO_DOWNLOADER is None:
+        with _INFO_DOWNLOADER_LOCK:
+            if _INFO_DOWNLOADER is None:
+                _INFO_DOWNLOADER = YouTubeDownloader()
+    return _INFO_DOWNLOADER
+
+
+def _scan_files(root: Path) -> Iterator[os.DirEntry]:
+    """
+    Yield every regular file under root.
+
+    Uses os.scandir so file type and stat results come from the directory
+    listing itself instead of extra stat() calls per path.
+
+    Args:
+        root: Directory tree to walk
+
+    Yields:
+        os.DirEntry for each file
+    """
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except OSError:
+            continue
+
+
+def enforce_size_limit(root: str, max_bytes: int, keep: Iterable[str] = ()) -> List[str]:
+    """
+    Delete least recently used downloads under root until it fits in max_bytes.
+
+    Each download directory (see YouTubeDownloader._output_dir_for) is
+    evicted as a whole, so a finished file and its completion marker always
+    go together. Directories are ranked by their marker's timestamp, which
+    cache hits refresh; those without a marker (downloads in progress or
+    abandoned) by their newest file.
+
+    Args:
+        root: Directory tree to trim
+        max_bytes: Maximum total size of the files under root
+        keep: Paths whose directories must not be deleted
+
+    Returns:
+        Paths of the deleted files
+    """
+    root = Path(root)
+    keep_dirs = {Path(path).parent for path in keep}
+    # directory -> [marker timestamp, newest file timestamp, size, file paths]
+    directories: Dict[Path, list] = {}
+    total = 0
+    for entry in _scan_files(root):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        path = Path(entry.path)
+        # atime may not be updated (noatime/relatime), so use whichever is newer
+        used = max(stat.st_atime, stat.st_mtime)
+        info = directories.setdefault(path.parent, [None, 0.0, 0, []])
+        if path.name == YouTubeDownloader.COMPLETE_MARKER:
+            info[0] = used
+        info[1] = max(info[1], used)
+        info[2] += stat.st_size
+        info[3].append(path)
+        total += stat.st_size
+
+    def last_used(item):
+        marker_used, newest, _, _ = item[1]
+        return newest if marker_used is None else marker_used
+
+    removed = []
+    for directory, (_, _, _, paths) in sorted(directories.items(), key=last_used):
+        if total <= max_bytes:
+            break
+        if directory in keep_dirs:
+            continue
+        for path in paths:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except OSError as e:
+                logger.error(f"Error evicting {path}: {e}")
+                continue
+            total -= size
+            removed.append(str(path))
+        if directory != root:
+            try:
+                directory.rmdir()
+            except OSError:
+                pass  # Directory still has files
+
+    return removed
+
+
 def format_duration(seconds: int) -> str:
     """
     Format duration in seconds to human-readable string.
@@ -556,6 +939,16 @@ def format_duration(seconds: int) -> str:
     return f"{minutes}:{secs:02d}"
 
 
+# (threshold, suffix) pairs, largest first
+_VIEW_SCALES = (
+    (1_000_000_000, 'B'),
+    (1_000_000, 'M'),
+    (1_000, 'K'),
+)
+
+FILE_SIZE_UNITS = ('bytes', 'KB', 'MB', 'GB')
+
+
 def format_view_count(count: int) -> str:
     """
     Format view count to human-readable string.
@@ -569,10 +962,27 @@ def format_view_count(count: int) -> str:
     if not count:
         return "0 views"
 
-    if count >= 1_000_000_000:
-        return f"{count / 1_000_000_000:.1f}B views"
-    elif count >= 1_000_000:
-        return f"{count / 1_000_000:.1f}M views"
-    elif count >= 1_000:
-        return f"{count / 1_000:.1f}K views"
+    for threshold, suffix in _VIEW_SCALES:
+        if count >= threshold:
+            return f"{count / threshold:.1f}{suffix} views"
     return f"{count} views"
+
+
+def format_file_size(size: int) -> str:
+    """
+    Format a byte count to human-readable string.
+
+    Args:
+        size: Size in bytes
+
+    Returns:
+        Formatted string (e.g., "1.5 MB")
+    """
+    if not size or size < 0:
+        return "0 bytes"
+
+    # bit_length gives an exact integer log2, so this is floor(log1024(size))
+    exponent = min((size.bit_length() - 1) // 10, len(FILE_SIZE_UNITS) - 1)
+    if exponent == 0:
+        return f"{size} bytes"
+    return f"{size / 1024 ** exponent:.1f} {FILE_SIZE_UNITS[exponent]}"
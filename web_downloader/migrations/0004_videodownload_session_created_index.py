@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-15 05:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('web_downloader', '0003_videodownload_session_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='videodownload',
+            index=models.Index(fields=['session_id', '-created_at'], name='download_session_created_idx'),
+        ),
+        # session_id's own index is a prefix of the one above. Drop it by name
+        # rather than through AlterField, which would rebuild the table on SQLite
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='videodownload',
+                    name='session_id',
+                    field=models.CharField(default='legacy', max_length=64),
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(
+                    'DROP INDEX IF EXISTS "web_downloader_videodownload_session_id_e3f57a37";',
+                    reverse_sql=(
+                        'CREATE INDEX "web_downloader_videodownload_session_id_e3f57a37" '
+                        'ON "web_downloader_videodownload" ("session_id");'
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -1,6 +1,15 @@
+from functools import lru_cache
+
 from django.db import models
 from django.utils import timezone
 
+from .helpers.downloader import format_duration, format_file_size
+
+
+# Memoized: list pages format the same handful of values over and over
+_format_duration = lru_cache(maxsize=1024)(format_duration)
+_format_file_size = lru_cache(maxsize=1024)(format_file_size)
+
 
 class VideoDownload(models.Model):
     """Model to track video download status and progress"""
@@ -26,8 +35,8 @@ class VideoDownload(models.Model):
         ('worst', 'Lowest Quality'),
     ]
     
-    # Session ID to isolate users
-    session_id = models.CharField(max_length=64, db_index=True, default='legacy')
+    # Session ID to isolate users; indexed by download_session_created_idx
+    session_id = models.CharField(max_length=64, default='legacy')
     
     url = models.URLField(max_length=500)
     title = models.CharField(max_length=500, blank=True)
@@ -46,6 +55,10 @@ class VideoDownload(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Serves the per-session "recent downloads" list in created_at order
+            models.Index(fields=['session_id', '-created_at'], name='download_session_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title or self.url} - {self.status}"
@@ -55,22 +68,11 @@ class VideoDownload(models.Model):
         """Return duration in human-readable format"""
         if not self.duration:
             return "0:00"
-        hours = self.duration // 3600
-        minutes = (self.duration % 3600) // 60
-        seconds = self.duration % 60
-        if hours > 0:
-            return f"{hours}:{minutes:02d}:{seconds:02d}"
-        return f"{minutes}:{seconds:02d}"
+        return _format_duration(self.duration)
     
     @property
     def file_size_formatted(self):
         """Return file size in human-readable format"""
         if not self.file_size:
             return ""
-        if self.file_size >= 1024 * 1024 * 1024:
-            return f"{self.file_size / (1024 * 1024 * 1024):.1f} GB"
-        elif self.file_size >= 1024 * 1024:
-            return f"{self.file_size / (1024 * 1024):.1f} MB"
-        elif self.file_size >= 1024:
-            return f"{self.file_size / 1024:.1f} KB"
-        return f"{self.file_size} bytes"
+        return _format_file_size(self.file_size)
@@ -1,9 +1,39 @@
-from django.test import TestCase, Client
+import json
+import threading
+
+from django.core.cache import caches
+from django.db import connection
+from django.http import QueryDict
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from unittest.mock import patch, MagicMock
 from .models import VideoDownload
-from .forms import DownloadForm
-from .helpers.downloader import YouTubeDownloader
+from .forms import BatchDownloadForm, DownloadForm
+from .helpers import downloader as downloader_module
+from .helpers.downloader import (
+    YouTubeDownloader,
+    enforce_size_limit,
+    format_file_size,
+    format_view_count,
+    get_info_downloader,
+)
+from .utils import (
+    PROGRESS_FIELDS,
+    claim_download,
+    download_video_thread,
+    make_progress_callback,
+    progress_cache_key,
+    progress_data,
+    start_download_workers,
+)
+from . import utils as utils_module
+
+# In-memory caches so tests never read or write the on-disk caches
+TEST_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+    for alias in ('default', 'video_info', 'progress')
+}
 
 
 class YouTubeURLValidationTestCase(TestCase):
@@ -43,6 +73,34 @@ class YouTubeURLValidationTestCase(TestCase):
         self.assertFalse(is_valid)
         self.assertEqual(error, "URL cannot be empty")
 
+    def test_invalid_url_mentioning_youtube(self):
+        """Test that URLs passing the host prefilter are still fully validated"""
+        invalid_urls = [
+            'https://example.com/youtube.com/watch?v=dQw4w9WgXcQ',
+            'https://www.youtube.com/feed/trending',
+        ]
+        for url in invalid_urls:
+            is_valid, error = YouTubeDownloader.validate_url(url)
+            self.assertFalse(is_valid, f"URL should be invalid: {url}")
+            self.assertEqual(error, "Invalid YouTube URL format")
+
+    def test_overlong_url_rejected(self):
+        """Test that overly long input is rejected before matching"""
+        is_valid, error = YouTubeDownloader.validate_url('https://youtu.be/' + 'a' * 600)
+        self.assertFalse(is_valid)
+        self.assertEqual(error, "URL is too long")
+
+    def test_validate_and_extract(self):
+        """Test validation and video ID extraction in a single call"""
+        test_cases = [
+            ('https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42', (True, 'dQw4w9WgXcQ', '')),
+            ('https://youtu.be/dQw4w9WgXcQ', (True, 'dQw4w9WgXcQ', '')),
+            ('https://www.youtube.com/playlist?list=PL590L5WQmH8fJ54F369BLDSqIwcs-TCfs', (True, None, '')),
+            ('https://google.com', (False, None, 'Invalid YouTube URL format')),
+        ]
+        for url, expected in test_cases:
+            self.assertEqual(YouTubeDownloader.validate_and_extract(url), expected, f"Failed for URL: {url}")
+
     def test_video_id_extraction(self):
         """Test video ID extraction from different URL formats"""
         test_cases = [
@@ -56,6 +114,17 @@ class YouTubeURLValidationTestCase(TestCase):
             extracted = YouTubeDownloader.extract_video_id(url)
             self.assertEqual(extracted, expected_id, f"Failed for URL: {url}")
 
+    def test_playlist_id_extraction(self):
+        """Test playlist ID extraction and playlist URL detection"""
+        test_cases = [
+            ('https://www.youtube.com/playlist?list=PLabc_123-x', 'PLabc_123-x'),
+            ('https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PLabc123&index=2', 'PLabc123'),
+            ('https://www.youtube.com/watch?v=dQw4w9WgXcQ', None),
+        ]
+        for url, expected_id in test_cases:
+            self.assertEqual(YouTubeDownloader.extract_playlist_id(url), expected_id, f"Failed for URL: {url}")
+            self.assertEqual(YouTubeDownloader.is_playlist_url(url), expected_id is not None)
+
 
 class DownloadFormTestCase(TestCase):
     """Test cases for the download form"""
@@ -93,6 +162,41 @@ class DownloadFormTestCase(TestCase):
         self.assertEqual(form.cleaned_data['quality'], 'best')
 
 
+class BatchDownloadFormTestCase(TestCase):
+    """Test cases for the multi-URL download form"""
+
+    URLS = [
+        'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+        'https://www.youtube.com/watch?v=9bZkp7q19f0',
+    ]
+
+    def test_save_many_creates_all_rows(self):
+        """Test that every URL becomes a pending download in one batch"""
+        form = BatchDownloadForm(QueryDict(mutable=True))
+        form.data.setlist('urls', self.URLS)
+        form.data.update({'format_type': 'mp3', 'quality': '720p'})
+        self.assertTrue(form.is_valid(), form.errors)
+
+        with CaptureQueriesContext(connection) as queries:
+            downloads = form.save_many('batch-session')
+
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+
+        self.assertTrue(all(download.pk for download in downloads))
+        rows = VideoDownload.objects.filter(session_id='batch-session')
+        self.assertEqual(sorted(rows.values_list('url', flat=True)), sorted(self.URLS))
+        self.assertEqual(set(rows.values_list('quality', flat=True)), {'best'})
+
+    def test_invalid_url_rejects_batch(self):
+        """Test that one invalid URL fails validation of the whole batch"""
+        form = BatchDownloadForm(QueryDict(mutable=True))
+        form.data.setlist('urls', self.URLS + ['https://example.com/video'])
+        form.data['format_type'] = 'mp4'
+        self.assertFalse(form.is_valid())
+        self.assertIn('urls', form.errors)
+
+
 class VideoDownloadModelTestCase(TestCase):
     """Test cases for the VideoDownload model"""
 
@@ -137,11 +241,29 @@ class VideoDownloadModelTestCase(TestCase):
         download.file_size = 1024 * 1024 * 1024
         self.assertEqual(download.file_size_formatted, '1.0 GB')
 
+    def test_file_size_formatted_unit_boundaries(self):
+        """Test file size formatting around unit boundaries"""
+        download = VideoDownload()
 
+        download.file_size = 1023
+        self.assertEqual(download.file_size_formatted, '1023 bytes')
+
+        download.file_size = 1536
+        self.assertEqual(download.file_size_formatted, '1.5 KB')
+
+        download.file_size = 1024 * 1024 - 1
+        self.assertEqual(download.file_size_formatted, '1024.0 KB')
+
+        download.file_size = 2 * 1024 ** 4
+        self.assertEqual(download.file_size_formatted, '2048.0 GB')
+
+
+@override_settings(CACHES=TEST_CACHES)
 class ViewsTestCase(TestCase):
     """Test cases for views"""
 
     def setUp(self):
+        caches['progress'].clear()
         self.client = Client()
 
     def test_index_page_loads(self):
@@ -166,27 +288,67 @@ class ViewsTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 404)
 
+    def _use_session(self, session_id):
+        session = self.client.session
+        session['downloader_session_id'] = session_id
+        session.save()
+
     def test_progress_endpoint_returns_data(self):
         """Test progress endpoint returns correct data for existing download"""
+        self._use_session('progress-session')
         download = VideoDownload.objects.create(
             url='https://www.youtube.com/watch?v=test',
             title='Test Video',
             status='downloading',
-            progress=50
+            progress=50,
+            duration=125,
+            session_id='progress-session',
         )
         response = self.client.get(
             reverse('web_downloader:get_progress', kwargs={'download_id': download.id})
         )
         self.assertEqual(response.status_code, 200)
+        self.assertIn('no-store', response['Cache-Control'])
         data = response.json()
         self.assertEqual(data['title'], 'Test Video')
         self.assertEqual(data['progress'], 50)
         self.assertEqual(data['status'], 'downloading')
+        self.assertEqual(data['duration'], '2:05')
+        self.assertFalse(data['file_available'])
+
+    def test_progress_endpoint_serves_cached_snapshot(self):
+        """Test progress polls are answered from the cache for the owning session"""
+        self._use_session('cached-session')
+        caches['progress'].set(progress_cache_key(12345), {
+            'session_id': 'cached-session',
+            'data': {'id': 12345, 'status': 'downloading', 'progress': 42},
+        })
+        caches['progress'].set(progress_cache_key(54321), {
+            'session_id': 'other-session',
+            'data': {'id': 54321, 'status': 'downloading', 'progress': 7},
+        })
+
+        with self.assertNumQueries(1):  # the session lookup only
+            response = self.client.get(reverse('web_downloader:get_progress', kwargs={'download_id': 12345}))
+        self.assertEqual(response.json()['progress'], 42)
+
+        response = self.client.get(reverse('web_downloader:get_progress', kwargs={'download_id': 54321}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_progress_endpoint_does_not_create_session(self):
+        """Test that polling without a session neither creates nor saves one"""
+        response = self.client.get(
+            reverse('web_downloader:get_progress', kwargs={'download_id': 1})
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn('sessionid', response.cookies)
 
     def test_delete_download(self):
         """Test deleting a download"""
+        self._use_session('delete-session')
         download = VideoDownload.objects.create(
-            url='https://www.youtube.com/watch?v=test'
+            url='https://www.youtube.com/watch?v=test',
+            session_id='delete-session',
         )
         response = self.client.post(
             reverse('web_downloader:delete_download', kwargs={'download_id': download.id})
@@ -194,8 +356,166 @@ class ViewsTestCase(TestCase):
         self.assertEqual(response.status_code, 302)  # Redirect
         self.assertFalse(VideoDownload.objects.filter(id=download.id).exists())
 
-    @patch('web_downloader.views.start_download')
-    def test_form_submission_creates_download(self, mock_start_download):
+    def test_delete_download_removes_file_with_one_lookup(self):
+        """Test that deleting reads the row once, deletes it and unlinks its file"""
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = Path(tmpdir) / 'Test_Video.mp4'
+            file_path.write_bytes(b'data')
+            download = self._completed_download(file_path)
+
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post(
+                    reverse('web_downloader:delete_download', kwargs={'download_id': download.id}),
+                    HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+                )
+            self.assertEqual(response.json()['success'], True)
+            self.assertFalse(file_path.exists())
+
+        download_queries = [query for query in queries if 'web_downloader_videodownload' in query['sql']]
+        self.assertEqual(len(download_queries), 2)  # one SELECT, one DELETE
+        self.assertFalse(VideoDownload.objects.filter(id=download.id).exists())
+
+    def test_delete_download_of_other_session(self):
+        """Test that downloads of another session cannot be deleted"""
+        self._use_session('delete-session')
+        download = VideoDownload.objects.create(url='https://www.youtube.com/watch?v=test', session_id='other')
+        response = self.client.post(
+            reverse('web_downloader:delete_download', kwargs={'download_id': download.id})
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(VideoDownload.objects.filter(id=download.id).exists())
+
+    def test_progress_stream_sends_session_snapshot(self):
+        """Test the progress stream pushes the session's downloads and then closes"""
+        self._use_session('stream-session')
+        download = VideoDownload.objects.create(
+            url='https://www.youtube.com/watch?v=test',
+            title='Streamed Video',
+            status='completed',
+            progress=100,
+            session_id='stream-session',
+        )
+        VideoDownload.objects.create(url='https://www.youtube.com/watch?v=other', session_id='other')
+
+        response = self.client.get(reverse('web_downloader:progress_stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        body = b''.join(response.streaming_content).decode()
+        events = [line[len('data: '):] for line in body.splitlines() if line.startswith('data: ')]
+        self.assertEqual(len(events), 1)
+        snapshot = json.loads(events[0])
+        self.assertEqual([item['id'] for item in snapshot], [download.id])
+        self.assertEqual(snapshot[0]['title'], 'Streamed Video')
+
+    def test_progress_stream_prefers_published_progress(self):
+        """Test the progress stream reports cached progress over the stored row"""
+        self._use_session('stream-session')
+        download = VideoDownload.objects.create(
+            url='https://www.youtube.com/watch?v=test',
+            status='completed',
+            session_id='stream-session',
+        )
+        caches['progress'].set(progress_cache_key(download.id), {
+            'session_id': 'stream-session',
+            'data': {'id': download.id, 'status': 'completed', 'progress': 100},
+        })
+
+        response = self.client.get(reverse('web_downloader:progress_stream'))
+        body = b''.join(response.streaming_content).decode()
+        events = [line[len('data: '):] for line in body.splitlines() if line.startswith('data: ')]
+        self.assertEqual(json.loads(events[0])[0]['progress'], 100)
+
+    def test_progress_stream_over_capacity(self):
+        """Test that streams beyond the per-process cap are turned away until one closes"""
+        self._use_session('stream-session')
+        url = reverse('web_downloader:progress_stream')
+        with patch('web_downloader.views._progress_stream_slots', threading.BoundedSemaphore(1)):
+            first = self.client.get(url)
+            self.assertEqual(first['Content-Type'], 'text/event-stream')
+            self.assertEqual(self.client.get(url).status_code, 204)
+
+            b''.join(first.streaming_content)  # the test client closes the response once consumed
+            self.assertEqual(self.client.get(url)['Content-Type'], 'text/event-stream')
+
+    def test_progress_stream_without_session(self):
+        """Test the progress stream tells clients without a session not to reconnect"""
+        response = self.client.get(reverse('web_downloader:progress_stream'))
+        self.assertEqual(response.status_code, 204)
+
+    def _completed_download(self, file_path):
+        self._use_session('file-session')
+        return VideoDownload.objects.create(
+            url='https://www.youtube.com/watch?v=test',
+            status='completed',
+            file_path=str(file_path),
+            session_id='file-session',
+        )
+
+    def test_download_file_streams_attachment(self):
+        """Test that a finished file is served as an attachment"""
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = Path(tmpdir) / 'Test_Video.mp4'
+            file_path.write_bytes(b'video-bytes')
+            download = self._completed_download(file_path)
+
+            response = self.client.get(reverse('web_downloader:download_file', kwargs={'download_id': download.id}))
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('attachment; filename="Test_Video.mp4"', response['Content-Disposition'])
+            self.assertEqual(b''.join(response.streaming_content), b'video-bytes')
+            response.close()
+
+    def test_download_file_missing_on_disk(self):
+        """Test that a completed download whose file is gone returns 404"""
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            download = self._completed_download(Path(tmpdir) / 'Missing.mp4')
+            response = self.client.get(reverse('web_downloader:download_file', kwargs={'download_id': download.id}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_download_file_uses_accel_redirect(self):
+        """Test that files are handed to the proxy when X-Accel-Redirect is configured"""
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file_path = Path(tmpdir) / 'session' / 'Test Video.mp4'
+            file_path.parent.mkdir()
+            file_path.write_bytes(b'video-bytes')
+            download = self._completed_download(file_path)
+
+            with override_settings(DOWNLOAD_ROOT=tmpdir, DOWNLOAD_ACCEL_REDIRECT_PREFIX='/internal-downloads/'):
+                response = self.client.get(
+                    reverse('web_downloader:download_file', kwargs={'download_id': download.id})
+                )
+            self.assertEqual(response['X-Accel-Redirect'], '/internal-downloads/session/Test%20Video.mp4')
+            self.assertEqual(response.content, b'')
+
+    @patch('web_downloader.views.start_download_workers')
+    def test_batch_submission_starts_every_download(self, mock_start_workers):
+        """Test that a multi-URL submission queues each download and wakes the workers"""
+        response = self.client.post(reverse('web_downloader:start_batch'), {
+            'urls': ['https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'https://youtu.be/9bZkp7q19f0'],
+            'format_type': 'mp4',
+            'quality': '1080p',
+        })
+        self.assertEqual(response.status_code, 200)
+        ids = response.json()['ids']
+        self.assertEqual(len(ids), 2)
+        mock_start_workers.assert_called_once()
+        self.assertEqual(
+            set(VideoDownload.objects.filter(id__in=ids).values_list('quality', flat=True)), {'1080p'}
+        )
+
+    @patch('web_downloader.views.start_download_workers')
+    def test_form_submission_creates_download(self, mock_start_workers):
         """Test that form submission creates a download and starts it"""
         response = self.client.post(
             reverse('web_downloader:index'),
@@ -207,7 +527,18 @@ class ViewsTestCase(TestCase):
         )
         self.assertEqual(response.status_code, 302)  # Redirect after success
         self.assertTrue(VideoDownload.objects.exists())
-        mock_start_download.assert_called_once()
+        mock_start_workers.assert_called_once()
+
+    @patch('web_downloader.views.start_download_workers')
+    def test_index_wakes_workers_for_stranded_downloads(self, mock_start_workers):
+        """Test that pending downloads left by an exited worker process get picked up"""
+        self._use_session('queue-session')
+        self.client.get(reverse('web_downloader:index'))
+        mock_start_workers.assert_not_called()
+
+        VideoDownload.objects.create(url='https://www.youtube.com/watch?v=test', session_id='queue-session')
+        self.client.get(reverse('web_downloader:index'))
+        mock_start_workers.assert_called_once()
 
 
 class DownloaderHelperTestCase(TestCase):
@@ -219,6 +550,14 @@ class DownloaderHelperTestCase(TestCase):
         for quality in expected_qualities:
             self.assertIn(quality, YouTubeDownloader.VIDEO_QUALITY_FORMATS)
 
+    def test_quality_choices_match_format_mappings(self):
+        """Test that the selectable qualities are exactly the mapped ones"""
+        choices = {value for value, label in VideoDownload.QUALITY_CHOICES}
+        self.assertEqual(choices, set(YouTubeDownloader.VIDEO_QUALITY_FORMATS))
+        self.assertIn(YouTubeDownloader.DEFAULT_QUALITY, choices)
+        with self.assertRaises(TypeError):
+            YouTubeDownloader.VIDEO_QUALITY_FORMATS['4k'] = 'best'
+
     def test_downloader_initialization_with_output_dir(self):
         """Test downloader initializes with specified output directory"""
         import tempfile
@@ -232,3 +571,530 @@ class DownloaderHelperTestCase(TestCase):
         self.assertTrue(downloader.output_dir.exists())
         downloader.cleanup()
 
+
+    @patch('web_downloader.helpers.downloader.YoutubeDL')
+    def test_download_reports_progress_from_hooks(self, mock_ydl_cls):
+        """Test in-process download forwards yt-dlp progress hooks to the callback"""
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_file = Path(tmpdir) / 'Test_Video.mp4'
+
+            def fake_extract_info(url, download):
+                ydl_opts = mock_ydl_cls.call_args[0][0]
+                for downloaded in (50, 100):
+                    for hook in ydl_opts['progress_hooks']:
+                        hook({
+                            'status': 'downloading',
+                            'filename': str(Path(tmpdir) / 'Test_Video.f137.mp4'),
+                            'downloaded_bytes': downloaded,
+                            'total_bytes': 100,
+                        })
+                # The merged output path is reported in requested_downloads
+                output_file.write_bytes(b'data')
+                return {'requested_downloads': [{'filepath': str(output_file)}]}
+
+            mock_ydl_cls.return_value.__enter__.return_value.extract_info.side_effect = fake_extract_info
+
+            callback = MagicMock()
+            downloader = YouTubeDownloader(output_dir=tmpdir)
+            success, message, file_path = downloader.download_video(
+                'https://www.youtube.com/watch?v=dQw4w9WgXcQ',
+                progress_callback=callback,
+            )
+
+            self.assertTrue(success)
+            self.assertEqual(file_path, str(output_file))
+            callback.assert_any_call(50, 'Test_Video.f137')
+            callback.assert_any_call(100, 'Test_Video.f137')
+            self.assertEqual((Path(tmpdir) / YouTubeDownloader.COMPLETE_MARKER).read_text(), 'Test_Video.mp4')
+
+    def test_info_downloader_is_shared(self):
+        """Test that metadata lookups reuse one downloader instance"""
+        self.assertIs(get_info_downloader(), get_info_downloader())
+
+    @override_settings(CACHES=TEST_CACHES)
+    @patch('web_downloader.helpers.downloader.tempfile.mkdtemp')
+    def test_metadata_lookups_create_no_directory(self, mock_mkdtemp):
+        """Test that a downloader used only for lookups never creates its temp directory"""
+        downloader = YouTubeDownloader()
+        with patch.object(downloader, '_extract_sync', return_value=None), \
+                patch.object(downloader, '_extract_playlist', return_value=None):
+            downloader.get_video_info('https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+            downloader.get_playlist_info('https://www.youtube.com/playlist?list=PLabc123')
+        downloader.cleanup()
+        mock_mkdtemp.assert_not_called()
+
+    def test_parse_percent_uses_numeric_counters(self):
+        """Test that progress is computed from byte or fragment counters"""
+        parse = YouTubeDownloader._parse_percent
+        self.assertEqual(parse({'downloaded_bytes': 25, 'total_bytes': 100}), 25)
+        self.assertEqual(parse({'downloaded_bytes': 50, 'total_bytes_estimate': 200}), 25)
+        self.assertEqual(parse({'downloaded_bytes': 10, 'fragment_index': 3, 'fragment_count': 4}), 75)
+        self.assertEqual(parse({'downloaded_bytes': 150, 'total_bytes_estimate': 100}), 100)
+        self.assertIsNone(parse({'_percent_str': ' 42.0%', 'downloaded_bytes': 10}))
+
+    @patch('web_downloader.helpers.downloader.YoutubeDL')
+    def test_finished_download_is_reused(self, mock_ydl_cls):
+        """Test that a repeat request for the same video and quality skips the network"""
+        import os
+        import tempfile
+
+        url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+        with tempfile.TemporaryDirectory() as tmpdir:
+            downloader = YouTubeDownloader(output_dir=tmpdir)
+            target_dir = downloader._output_dir_for(url, '720p', 'mp4')
+            target_dir.mkdir()
+            (target_dir / 'Test_Video.mp4').write_bytes(b'data')
+            YouTubeDownloader._mark_complete(target_dir / 'Test_Video.mp4')
+            marker = target_dir / YouTubeDownloader.COMPLETE_MARKER
+            os.utime(marker, (1000, 1000))
+
+            success, message, file_path = downloader.download_video(url, quality='720p')
+            self.assertTrue(success)
+            self.assertEqual(file_path, str(target_dir / 'Test_Video.mp4'))
+            mock_ydl_cls.assert_not_called()
+            # Reuse counts as a use for eviction
+            self.assertGreater(marker.stat().st_mtime, 1000)
+
+            # Other qualities are separate entries
+            self.assertIsNone(downloader._cached_result(url, '1080p', 'mp4'))
+
+            # An evicted file is downloaded again
+            (target_dir / 'Test_Video.mp4').unlink()
+            self.assertIsNone(downloader._cached_result(url, '720p', 'mp4'))
+
+    def test_unfinished_download_is_not_reused(self):
+        """Test that output left by an interrupted download is not served"""
+        import tempfile
+
+        url = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+        with tempfile.TemporaryDirectory() as tmpdir:
+            downloader = YouTubeDownloader(output_dir=tmpdir)
+
+            # Merger output before yt-dlp renamed it into place
+            video_dir = downloader._output_dir_for(url, '720p', 'mp4')
+            video_dir.mkdir()
+            (video_dir / 'Test_Video.temp.mp4').write_bytes(b'data')
+            self.assertIsNone(downloader._cached_result(url, '720p', 'mp4'))
+
+            # MP3 written while the source stream is still being converted
+            audio_dir = downloader._output_dir_for(url, 'best', 'mp3')
+            audio_dir.mkdir()
+            (audio_dir / 'Test_Video.m4a').write_bytes(b'data')
+            (audio_dir / 'Test_Video.mp3').write_bytes(b'data')
+            self.assertIsNone(downloader._cached_result(url, 'best', 'mp3'))
+
+    @patch('web_downloader.helpers.downloader.YoutubeDL')
+    def test_playlist_info_uses_flat_extraction(self, mock_ydl_cls):
+        """Test that playlist entries are read from a flat in-process extraction"""
+        mock_ydl = mock_ydl_cls.return_value.__enter__.return_value
+        mock_ydl.extract_info.return_value = {
+            '_type': 'playlist',
+            'title': 'Mix',
+            'uploader': 'Someone',
+            'entries': [
+                {'id': 'aaaaaaaaaaa', 'title': 'One', 'duration': 3600},
+                {'id': 'bbbbbbbbbbb', 'title': 'Two', 'duration': None},
+            ],
+        }
+
+        downloader = YouTubeDownloader()
+        try:
+            info = downloader._extract_playlist('https://www.youtube.com/playlist?list=PLabc123')
+        finally:
+            downloader.cleanup()
+
+        self.assertEqual(mock_ydl_cls.call_args[0][0]['extract_flat'], 'in_playlist')
+        self.assertEqual(info['title'], 'Mix')
+        self.assertEqual(info['playlist_id'], 'PLabc123')
+        self.assertEqual(info['video_count'], 2)
+        self.assertEqual(info['total_duration_formatted'], '1:00:00')
+        self.assertEqual(info['videos'][1]['duration_formatted'], 'N/A')
+        self.assertEqual(info['videos'][1]['thumbnail'], 'https://i.ytimg.com/vi/bbbbbbbbbbb/hqdefault.jpg')
+
+    def test_enforce_size_limit_evicts_least_recent(self):
+        """Test that the oldest download directories are evicted until the tree fits the cap"""
+        import os
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = []
+            for index in range(3):
+                path = Path(tmpdir) / f'key{index}' / 'video.mp4'
+                path.parent.mkdir()
+                path.write_bytes(b'x' * 100)
+                YouTubeDownloader._mark_complete(path)
+                os.utime(path.parent / YouTubeDownloader.COMPLETE_MARKER, (1000 + index, 1000 + index))
+                paths.append(path)
+
+            removed = enforce_size_limit(tmpdir, 150, keep=[str(paths[0])])
+
+            self.assertEqual(
+                sorted(removed),
+                sorted(str(path.parent / name) for path in paths[1:]
+                       for name in ('video.mp4', YouTubeDownloader.COMPLETE_MARKER)),
+            )
+            self.assertTrue(paths[0].exists())
+            self.assertFalse(paths[1].parent.exists())
+            self.assertFalse(paths[2].parent.exists())
+
+    def test_enforce_size_limit_ranks_by_marker(self):
+        """Test that a download's marker, not its media file, decides when it is evicted"""
+        import os
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            reused = Path(tmpdir) / 'reused' / 'video.mp4'
+            stale = Path(tmpdir) / 'stale' / 'video.mp4'
+            for path, file_time, marker_time in ((reused, 1000, 3000), (stale, 2000, 2000)):
+                path.parent.mkdir()
+                path.write_bytes(b'x' * 100)
+                YouTubeDownloader._mark_complete(path)
+                os.utime(path, (file_time, file_time))
+                os.utime(path.parent / YouTubeDownloader.COMPLETE_MARKER, (marker_time, marker_time))
+
+            enforce_size_limit(tmpdir, 150)
+
+            self.assertTrue(reused.exists())
+            self.assertFalse(stale.parent.exists())
+
+    def test_format_view_count(self):
+        """Test view count formatting across scales"""
+        self.assertEqual(format_view_count(0), '0 views')
+        self.assertEqual(format_view_count(999), '999 views')
+        self.assertEqual(format_view_count(1_500), '1.5K views')
+        self.assertEqual(format_view_count(2_300_000), '2.3M views')
+        self.assertEqual(format_view_count(1_000_000_000), '1.0B views')
+
+    def test_format_file_size(self):
+        """Test file size formatting across units"""
+        self.assertEqual(format_file_size(0), '0 bytes')
+        self.assertEqual(format_file_size(500), '500 bytes')
+        self.assertEqual(format_file_size(1536), '1.5 KB')
+        self.assertEqual(format_file_size(5 * 1024 * 1024), '5.0 MB')
+        self.assertEqual(format_file_size(1024 ** 3), '1.0 GB')
+
+
+@override_settings(CACHES=TEST_CACHES)
+class VideoInfoCacheTestCase(TestCase):
+    """Test cases for the video metadata cache"""
+
+    URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+    def setUp(self):
+        caches['video_info'].clear()
+        self.downloader = YouTubeDownloader()
+
+    def tearDown(self):
+        self.downloader.cleanup()
+
+    def test_repeat_lookup_uses_cache(self):
+        """Test that a second lookup for the same video skips extraction"""
+        with patch.object(self.downloader, '_extract_sync', return_value={'title': 'Cached'}) as mock_extract:
+            self.assertEqual(self.downloader.get_video_info(self.URL), {'title': 'Cached'})
+            self.assertEqual(self.downloader.get_video_info('https://youtu.be/dQw4w9WgXcQ'), {'title': 'Cached'})
+        mock_extract.assert_called_once()
+
+    def test_invalidate_forces_refetch(self):
+        """Test that invalidating a video ID refetches its metadata"""
+        with patch.object(self.downloader, '_extract_sync', return_value={'title': 'Cached'}) as mock_extract:
+            self.downloader.get_video_info(self.URL)
+            YouTubeDownloader.invalidate('dQw4w9WgXcQ')
+            self.downloader.get_video_info(self.URL)
+        self.assertEqual(mock_extract.call_count, 2)
+
+    def test_failed_lookup_is_not_cached(self):
+        """Test that failed extractions are retried on the next lookup"""
+        with patch.object(self.downloader, '_extract_sync', return_value=None) as mock_extract:
+            self.assertIsNone(self.downloader.get_video_info(self.URL))
+            self.assertIsNone(self.downloader.get_video_info(self.URL))
+        self.assertEqual(mock_extract.call_count, 2)
+
+    def test_concurrent_lookups_share_one_extraction(self):
+        """Test that simultaneous lookups of one video extract it only once"""
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def slow_extract(url):
+            started.set()
+            release.wait(5)
+            return None  # failures are not cached, so only coalescing avoids a second call
+
+        def lookup():
+            results.append(self.downloader.get_video_info(self.URL))
+
+        with patch.object(self.downloader, '_extract_sync', side_effect=slow_extract) as mock_extract:
+            leader = threading.Thread(target=lookup)
+            leader.start()
+            self.assertTrue(started.wait(5))
+            follower = threading.Thread(target=lookup)
+            follower.start()
+            follower.join(0.2)  # let the follower start waiting on the leader
+            release.set()
+            leader.join(5)
+            follower.join(5)
+
+        mock_extract.assert_called_once()
+        self.assertEqual(results, [None, None])
+
+    def test_playlist_lookup_uses_cache(self):
+        """Test that playlist listings are cached by playlist ID until invalidated"""
+        url = 'https://www.youtube.com/playlist?list=PLabc123'
+        with patch.object(self.downloader, '_extract_playlist', return_value={'title': 'Mix'}) as mock_extract:
+            self.assertEqual(self.downloader.get_playlist_info(url), {'title': 'Mix'})
+            self.assertEqual(self.downloader.get_playlist_info(url + '&index=2'), {'title': 'Mix'})
+            mock_extract.assert_called_once()
+
+            YouTubeDownloader.invalidate_playlist('PLabc123')
+            self.downloader.get_playlist_info(url)
+        self.assertEqual(mock_extract.call_count, 2)
+
+    @patch('web_downloader.helpers.downloader.YoutubeDL')
+    def test_extraction_reuses_pooled_instance(self, mock_ydl_cls):
+        """Test that metadata lookups share a YoutubeDL instance"""
+        while not downloader_module._YDL_POOL.empty():
+            downloader_module._YDL_POOL.get_nowait()
+        mock_ydl_cls.return_value.extract_info.return_value = {'title': 'Pooled', 'duration': 61}
+
+        first = self.downloader._extract_sync(self.URL)
+        second = self.downloader._extract_sync('https://youtu.be/dQw4w9WgXcQ')
+
+        self.assertEqual(first['title'], 'Pooled')
+        self.assertEqual(second['duration_formatted'], '1:01')
+        mock_ydl_cls.assert_called_once()
+        self.assertEqual(mock_ydl_cls.return_value.extract_info.call_count, 2)
+        downloader_module._YDL_POOL.get_nowait()
+
+    @patch('web_downloader.helpers.downloader.YoutubeDL')
+    def test_pooled_instances_reload_changed_cookies(self, mock_ydl_cls):
+        """Test that pooled instances are replaced after the cookies file changes"""
+        while not downloader_module._YDL_POOL.empty():
+            downloader_module._YDL_POOL.get_nowait()
+        stale, fresh = MagicMock(params={'cookiefile': 'cookies.txt'}), MagicMock()
+        mock_ydl_cls.side_effect = [stale, fresh]
+
+        with patch('web_downloader.helpers.downloader._cookie_version', return_value=1.0):
+            with downloader_module._metadata_ydl() as ydl:
+                self.assertIs(ydl, stale)
+            with downloader_module._metadata_ydl() as ydl:
+                self.assertIs(ydl, stale)
+        with patch('web_downloader.helpers.downloader._cookie_version', return_value=2.0):
+            with downloader_module._metadata_ydl() as ydl:
+                self.assertIs(ydl, fresh)
+
+        # Closed without saving its old cookie jar over the new file
+        stale.close.assert_called_once()
+        self.assertIsNone(stale.params['cookiefile'])
+        downloader_module._YDL_POOL.get_nowait()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DownloadWorkerTestCase(TestCase):
+    """Test cases for the background download worker helpers"""
+
+    def setUp(self):
+        caches['progress'].clear()
+        self.download = VideoDownload.objects.create(
+            url='https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+        )
+
+    def test_claim_download_marks_fetching_once(self):
+        """Test that a pending download can only be claimed once"""
+        claimed = claim_download(self.download.id)
+        self.assertIsNotNone(claimed)
+        self.assertEqual(claimed.status, 'fetching')
+        self.assertIsNone(claim_download(self.download.id))
+
+    def test_claim_download_writes_before_reading(self):
+        """Test that claiming starts with the conditional UPDATE, not a read"""
+        with CaptureQueriesContext(connection) as queries:
+            claim_download(self.download.id)
+        self.assertTrue(queries.captured_queries[0]['sql'].startswith('UPDATE'))
+
+    @patch('web_downloader.utils.download_video_thread')
+    def test_worker_drains_queue_oldest_first(self, mock_thread):
+        """Test that a worker runs every pending download in order and frees its slot"""
+        mock_thread.side_effect = lambda download_id: VideoDownload.objects.filter(
+            pk=download_id).update(status='completed')
+        newer = VideoDownload.objects.create(url='https://youtu.be/9bZkp7q19f0')
+
+        slots = threading.BoundedSemaphore(1)
+        slots.acquire()
+        with patch('web_downloader.utils._worker_slots', slots):
+            utils_module._download_worker()
+            self.assertTrue(slots.acquire(blocking=False))
+
+        self.assertEqual([c.args[0] for c in mock_thread.call_args_list], [self.download.id, newer.id])
+
+    @patch('web_downloader.utils.download_video_thread')
+    def test_worker_stops_on_unclaimable_download(self, mock_thread):
+        """Test that a row stuck in 'pending' doesn't make the worker spin"""
+        utils_module._drain_pending()
+        mock_thread.assert_called_once_with(self.download.id)
+
+    @patch('web_downloader.utils.threading.Thread')
+    def test_start_download_workers_is_bounded(self, mock_thread_cls):
+        """Test that no more than DOWNLOAD_WORKERS worker threads are started"""
+        with patch('web_downloader.utils._worker_slots', threading.BoundedSemaphore(2)):
+            for _ in range(3):
+                start_download_workers()
+        self.assertEqual(mock_thread_cls.return_value.start.call_count, 2)
+
+    def test_exit_requeues_active_downloads(self):
+        """Test that downloads interrupted by process exit go back to the queue"""
+        VideoDownload.objects.filter(pk=self.download.id).update(status='downloading', progress=40)
+        with patch('web_downloader.utils._active_downloads', {self.download.id}):
+            utils_module._requeue_active_downloads()
+
+        self.download.refresh_from_db()
+        self.assertEqual(self.download.status, 'pending')
+        self.assertEqual(self.download.progress, 0)
+
+    def _published_progress(self):
+        return caches['progress'].get(progress_cache_key(self.download.id))['data']['progress']
+
+    def test_progress_callback_publishes_progress_and_fills_title(self):
+        """Test that progress goes to the cache and only an empty title is stored"""
+        progress_callback = make_progress_callback(self.download.id, min_interval=0)
+        progress_callback(10, 'First_Title')
+        progress_callback(20, 'Second_Title')
+
+        self.assertEqual(self._published_progress(), 20)
+        self.download.refresh_from_db()
+        self.assertEqual(self.download.progress, 0)
+        self.assertEqual(self.download.title, 'First_Title')
+
+    def test_progress_callback_fills_title_once(self):
+        """Test that only the first tick touches the database"""
+        progress_callback = make_progress_callback(self.download.id, min_interval=0)
+        with self.assertNumQueries(2):  # title fill + snapshot rebuild
+            progress_callback(10, 'First_Title')
+        with self.assertNumQueries(0):
+            progress_callback(20, 'First_Title')
+
+    def test_progress_callback_without_title_fill(self):
+        """Test that a download with a known title only reads its snapshot once"""
+        progress_callback = make_progress_callback(self.download.id, fill_title=False)
+        with self.assertNumQueries(1):
+            progress_callback(10, 'Stream_Title')
+
+        self.download.refresh_from_db()
+        self.assertEqual(self.download.title, '')
+
+    def test_progress_callback_skips_unchanged_percent(self):
+        """Test that repeated percentages within the interval are not published"""
+        progress_callback = make_progress_callback(self.download.id)
+        progress_callback(10, '')
+        caches['progress'].clear()
+        progress_callback(10, '')
+
+        self.assertIsNone(caches['progress'].get(progress_cache_key(self.download.id)))
+
+    def test_progress_callback_throttles_until_complete(self):
+        """Test that updates within the interval are dropped except for 100%"""
+        progress_callback = make_progress_callback(self.download.id)
+        progress_callback(10, '')
+        progress_callback(50, '')
+        self.assertEqual(self._published_progress(), 10)
+
+        progress_callback(100, '')
+        self.assertEqual(self._published_progress(), 100)
+
+    @patch('web_downloader.utils.YouTubeDownloader')
+    def test_download_thread_stores_metadata_and_result(self, mock_downloader_cls):
+        """Test that a finished download records its metadata and file"""
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            output_file = Path(tmpdir) / 'Test_Video.mp4'
+            output_file.write_bytes(b'data')
+            mock_downloader = mock_downloader_cls.return_value
+            mock_downloader.get_video_info.return_value = {
+                'title': 'Test Video', 'thumbnail': 'thumb.jpg', 'duration': 42, 'uploader': 'Uploader',
+            }
+            mock_downloader.download_video.return_value = (True, 'ok', str(output_file))
+
+            with override_settings(DOWNLOAD_ROOT=tmpdir):
+                download_video_thread(self.download.id)
+
+        self.download.refresh_from_db()
+        self.assertEqual(self.download.status, 'completed')
+        self.assertEqual(self.download.title, 'Test Video')
+        self.assertEqual(self.download.duration, 42)
+        self.assertEqual(self.download.file_path, str(output_file))
+        self.assertEqual(self.download.file_size, 4)
+        self.assertIsNotNone(self.download.completed_at)
+
+        # The finished state is served from the row; the snapshot is dropped
+        self.assertIsNone(caches['progress'].get(progress_cache_key(self.download.id)))
+
+    @patch('web_downloader.utils.YouTubeDownloader')
+    def test_eviction_clears_other_sessions_files(self, mock_downloader_cls):
+        """Test that a download evicting another session's file stops that row offering it"""
+        import os
+        import tempfile
+        from pathlib import Path
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            old_file = Path(tmpdir) / 'first-session' / 'key1' / 'Old_Video.mp4'
+            old_file.parent.mkdir(parents=True)
+            old_file.write_bytes(b'x' * 100)
+            os.utime(old_file, (1000, 1000))
+            old_download = VideoDownload.objects.create(
+                url='https://youtu.be/9bZkp7q19f0',
+                session_id='first-session',
+                status='completed',
+                file_path=str(old_file),
+            )
+
+            new_file = Path(tmpdir) / 'legacy' / 'key2' / 'New_Video.mp4'
+            new_file.parent.mkdir(parents=True)
+            new_file.write_bytes(b'x' * 100)
+            mock_downloader = mock_downloader_cls.return_value
+            mock_downloader.get_video_info.return_value = None
+            mock_downloader.download_video.return_value = (True, 'ok', str(new_file))
+
+            with override_settings(DOWNLOAD_ROOT=tmpdir, DOWNLOAD_CACHE_MAX_BYTES=150):
+                download_video_thread(self.download.id)
+
+            self.assertFalse(old_file.exists())
+            self.assertTrue(new_file.exists())
+
+        old_download.refresh_from_db()
+        self.assertEqual(old_download.file_path, '')
+        self.assertFalse(progress_data(
+            VideoDownload.objects.filter(pk=old_download.pk).values(*PROGRESS_FIELDS).get()
+        )['file_available'])
+
+    @patch('web_downloader.utils.YouTubeDownloader')
+    def test_download_thread_records_failure(self, mock_downloader_cls):
+        """Test that a failed download stores the error message"""
+        import tempfile
+
+        mock_downloader = mock_downloader_cls.return_value
+        mock_downloader.get_video_info.return_value = None
+        mock_downloader.download_video.return_value = (False, 'Download failed: boom', None)
+
+        with tempfile.TemporaryDirectory() as tmpdir, override_settings(DOWNLOAD_ROOT=tmpdir):
+            download_video_thread(self.download.id)
+
+        self.download.refresh_from_db()
+        self.assertEqual(self.download.status, 'failed')
+        self.assertEqual(self.download.error_message, 'Download failed: boom')
+
+    def test_progress_callback_updates_cached_snapshot(self):
+        """Test that progress ticks refresh a published snapshot"""
+        caches['progress'].set(progress_cache_key(self.download.id), {
+            'session_id': '', 'data': {'progress': 0, 'title': 'Processing...'},
+        })
+        progress_callback = make_progress_callback(self.download.id)
+        progress_callback(30, 'Fallback_Title')
+
+        cached = caches['progress'].get(progress_cache_key(self.download.id))
+        self.assertEqual(cached['data'], {'progress': 30, 'title': 'Fallback_Title'})
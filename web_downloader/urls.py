@@ -6,9 +6,11 @@ app_name = 'web_downloader'
 urlpatterns = [
     path('', views.index, name='index'),
     path('preview/', views.preview, name='preview'),
+    path('progress/stream/', views.progress_stream, name='progress_stream'),
     path('progress/<int:download_id>/', views.get_progress, name='get_progress'),
     path('download/<int:download_id>/', views.download_file, name='download_file'),
     path('delete/<int:download_id>/', views.delete_download, name='delete_download'),
     path('api/video-info/', views.get_video_info, name='get_video_info'),
+    path('api/downloads/', views.start_batch, name='start_batch'),
     path('error/', views.error_page, name='error'),
 ]
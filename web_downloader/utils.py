@@ -2,95 +2,231 @@
 Utility functions for downloading videos using yt-dlp
 Uses the helpers/downloader.py module for core functionality
 """
+import atexit
 import os
 import threading
 import logging
 import time
 from pathlib import Path
 from django.conf import settings
+from django.core.cache import caches
 from django.utils import timezone
-from django.db import transaction, OperationalError
+from django.db import connection
 from .models import VideoDownload
-from .helpers.downloader import YouTubeDownloader
+from .helpers.downloader import YouTubeDownloader, enforce_size_limit, format_duration
 
 logger = logging.getLogger(__name__)
 
+# Pending rows are the download queue. Up to DOWNLOAD_WORKERS worker threads
+# per process claim them oldest first, so downloads queued by a process that
+# has since exited are still picked up (see start_download_workers)
+_worker_slots = threading.BoundedSemaphore(settings.DOWNLOAD_WORKERS)
 
-def retry_on_db_lock(func, max_retries=5, initial_delay=0.1):
+# Downloads running in this process, put back in the queue if it exits
+_active_downloads = set()
+_active_downloads_lock = threading.Lock()
+
+# Progress snapshots of running downloads live in this cache (see
+# settings.CACHES). Progress ticks are only published here; the database is
+# written at status changes, so an entry that expires or is missing falls
+# back to the last stored state
+PROGRESS_CACHE_ALIAS = 'progress'
+PROGRESS_CACHE_TTL = 60 * 60
+
+# Final states; their snapshots are dropped, as the row already holds them
+FINISHED_STATUSES = ('completed', 'failed')
+
+# Signalled whenever a download in this process changes, so progress streams
+# wake up immediately instead of waiting for their next refresh
+_progress_changed = threading.Condition()
+
+
+def notify_progress_changed():
+    """Wake up progress streams waiting in this process"""
+    with _progress_changed:
+        _progress_changed.notify_all()
+
+
+def wait_for_progress_change(timeout):
+    """Block until a download changes in this process or timeout seconds pass"""
+    with _progress_changed:
+        _progress_changed.wait(timeout)
+
+
+# Columns needed to build progress_data; read with .values(*PROGRESS_FIELDS)
+PROGRESS_FIELDS = (
+    'id', 'title', 'status', 'progress', 'error_message',
+    'file_path', 'thumbnail', 'duration', 'format_type',
+)
+
+
+def progress_data(row):
     """
-    Retry a database operation if it's locked
-    Uses exponential backoff
+    Serialize the progress fields of a download for the API
+    Takes a dict of PROGRESS_FIELDS, e.g. a .values(*PROGRESS_FIELDS) row
     """
-    for attempt in range(max_retries):
-        try:
-            return func()
-        except OperationalError as e:
-            if 'database is locked' in str(e).lower() and attempt < max_retries - 1:
-                delay = initial_delay * (2 ** attempt)  # Exponential backoff
-                logger.warning(f"Database locked, retrying in {delay}s (attempt {attempt + 1}/{max_retries})")
-                time.sleep(delay)
-            else:
-                raise
-    raise OperationalError("Max retries exceeded for database operation")
-
-
-def safe_save(instance):
-    """Safely save a model instance with retry logic"""
-    def save_func():
-        with transaction.atomic():
-            instance.save()
-    retry_on_db_lock(save_func)
-
-
-def get_download_dir():
-    """Get or create the downloads directory"""
-    download_dir = Path(settings.BASE_DIR) / 'downloads'
+    return {
+        'id': row['id'],
+        'title': row['title'] or 'Processing...',
+        'status': row['status'],
+        'progress': row['progress'],
+        'error_message': row['error_message'],
+        'file_available': bool(row['file_path'] and row['status'] == 'completed'),
+        'thumbnail': row['thumbnail'],
+        'duration': format_duration(row['duration']),
+        'format_type': row['format_type'],
+    }
+
+
+def progress_cache_key(download_id):
+    """Key of a download's progress snapshot in the progress cache"""
+    return f'progress:{download_id}'
+
+
+def publish_progress(download):
+    """
+    Cache the progress snapshot of a download so get_progress can answer
+    polls without a query; stored with the owning session for access checks
+    A finished download's snapshot is deleted instead, so the file cache only
+    holds running downloads (each set() scans the whole cache directory)
+    """
+    cache = caches[PROGRESS_CACHE_ALIAS]
+    if download.status in FINISHED_STATUSES:
+        cache.delete(progress_cache_key(download.id))
+        return
+    cache.set(
+        progress_cache_key(download.id),
+        {
+            'session_id': download.session_id,
+            'data': progress_data({field: getattr(download, field) for field in PROGRESS_FIELDS}),
+        },
+        PROGRESS_CACHE_TTL,
+    )
+
+
+def _load_progress_entry(download_id):
+    """Rebuild a download's progress cache entry from its stored row"""
+    row = VideoDownload.objects.filter(pk=download_id).values('session_id', *PROGRESS_FIELDS).first()
+    if row is None:
+        return None
+    return {'session_id': row.pop('session_id'), 'data': progress_data(row)}
+
+
+def cached_progress(rows):
+    """
+    Serialize .values(*PROGRESS_FIELDS) rows, preferring the live snapshot
+    published to the progress cache over the stored progress
+    """
+    rows = list(rows)
+    keys = [progress_cache_key(row['id']) for row in rows]
+    cached = caches[PROGRESS_CACHE_ALIAS].get_many(keys)
+    return [
+        cached[key]['data'] if key in cached else progress_data(row)
+        for key, row in zip(keys, rows)
+    ]
+
+
+def get_download_dir(session_id=None):
+    """Get or create the downloads directory, optionally for a single session"""
+    download_dir = Path(settings.DOWNLOAD_ROOT)
+    if session_id:
+        download_dir = download_dir / session_id
     download_dir.mkdir(parents=True, exist_ok=True)
     return download_dir
 
 
+def make_progress_callback(download_id, min_interval=1.0, fill_title=True):
+    """
+    Build a progress callback that publishes progress to the progress cache
+    Publishes only when the whole percentage changed and min_interval seconds
+    have passed since the last update; reaching 100% is always published
+    Progress is never written to the database; only a missing title is filled
+    there (once, unless fill_title=False because the row already has one)
+    """
+    state = {'percent': -1, 'updated_at': 0.0, 'title_set': not fill_title}
+    
+    def progress_callback(percent, title):
+        """Publish download progress"""
+        percent = int(percent)
+        now = time.monotonic()
+        if percent == state['percent']:
+            return
+        if percent < 100 and now - state['updated_at'] < min_interval:
+            return
+        state['percent'] = percent
+        state['updated_at'] = now
+        
+        filled_title = None
+        if title and not state['title_set']:
+            # Only fills the title if metadata lookup didn't provide one
+            state['title_set'] = True
+            try:
+                if VideoDownload.objects.filter(pk=download_id, title='').update(title=title[:500]):
+                    filled_title = title[:500]
+            except Exception as e:
+                logger.error(f"Error storing title: {e}")
+        
+        try:
+            cache = caches[PROGRESS_CACHE_ALIAS]
+            key = progress_cache_key(download_id)
+            entry = cache.get(key) or _load_progress_entry(download_id)
+            if entry is None:
+                return
+            entry['data']['progress'] = percent
+            if filled_title:
+                entry['data']['title'] = filled_title
+            cache.set(key, entry, PROGRESS_CACHE_TTL)
+        except Exception as e:
+            logger.error(f"Error publishing progress: {e}")
+            return
+        
+        notify_progress_changed()
+    
+    return progress_callback
+
+
+def claim_download(download_id):
+    """
+    Atomically move a pending download to 'fetching'
+    A single conditional UPDATE, so concurrent workers can't both claim a
+    row (SQLite ignores SELECT ... FOR UPDATE)
+    Returns the download, or None if it doesn't exist or another worker owns it
+    """
+    if not VideoDownload.objects.filter(pk=download_id, status='pending').update(status='fetching'):
+        return None
+    return VideoDownload.objects.get(pk=download_id)
+
+
 def download_video_thread(download_id):
     """
     Background thread function to download a video
     Updates the VideoDownload model instance with progress
     """
     try:
-        def get_download():
-            return VideoDownload.objects.get(id=download_id)
+        download = claim_download(download_id)
+        if download is None:
+            logger.warning(f"Download {download_id} not found or already claimed")
+            return
         
-        download = retry_on_db_lock(get_download)
-        download.status = 'fetching'
-        safe_save(download)
-        
-        output_dir = get_download_dir()
+        output_dir = get_download_dir(download.session_id)
         downloader = YouTubeDownloader(output_dir=str(output_dir))
         
-        # Fetch video info first
+        # Fetch video info first; stored together with the status change
+        update_fields = ['status']
         video_info = downloader.get_video_info(download.url)
         if video_info:
             download.title = video_info.get('title', '')[:500]
             download.thumbnail = video_info.get('thumbnail', '')[:500] if video_info.get('thumbnail') else ''
             download.duration = video_info.get('duration', 0) or 0
             download.uploader = video_info.get('uploader', '')[:200] if video_info.get('uploader') else ''
-            safe_save(download)
+            update_fields += ['title', 'thumbnail', 'duration', 'uploader']
         
         download.status = 'downloading'
-        safe_save(download)
+        download.save(update_fields=update_fields)
+        publish_progress(download)
+        notify_progress_changed()
         
-        def progress_callback(percent, title):
-            """Update download progress in database"""
-            try:
-                def get_and_update():
-                    dl = VideoDownload.objects.get(id=download_id)
-                    dl.progress = percent
-                    if title and not dl.title:
-                        dl.title = title[:500]
-                    return dl
-                
-                dl = retry_on_db_lock(get_and_update)
-                safe_save(dl)
-            except Exception as e:
-                logger.error(f"Error updating progress: {e}")
+        progress_callback = make_progress_callback(download_id, fill_title=not download.title)
         
         # Perform the download based on format type
         if download.format_type == 'mp3':
@@ -117,30 +253,115 @@ def download_video_thread(download_id):
             except Exception:
                 pass
             
-            safe_save(download)
+            download.save(update_fields=['file_path', 'status', 'progress', 'completed_at', 'file_size'])
+            publish_progress(download)
+            
+            try:
+                evicted = enforce_size_limit(get_download_dir(), settings.DOWNLOAD_CACHE_MAX_BYTES, keep=[file_path])
+                if evicted:
+                    # Eviction spans every session; stop offering files that are gone
+                    VideoDownload.objects.filter(file_path__in=evicted).update(file_path='')
+            except Exception as e:
+                logger.error(f"Error trimming download cache: {e}")
         else:
             download.status = 'failed'
             download.error_message = message or 'Download failed'
-            safe_save(download)
+            download.save(update_fields=['status', 'error_message'])
+            publish_progress(download)
             
-    except VideoDownload.DoesNotExist:
-        logger.error(f"Download {download_id} not found")
     except Exception as e:
         logger.exception(f"Error in download thread: {e}")
         try:
-            def get_download():
-                return VideoDownload.objects.get(id=download_id)
-            
-            download = retry_on_db_lock(get_download)
-            download.status = 'failed'
-            download.error_message = str(e)
-            safe_save(download)
+            VideoDownload.objects.filter(pk=download_id).update(status='failed', error_message=str(e))
+            caches[PROGRESS_CACHE_ALIAS].delete(progress_cache_key(download_id))
         except Exception:
             pass
+    finally:
+        notify_progress_changed()
+
+
+def _next_pending_id():
+    """ID of the oldest pending download, or None if nothing is queued"""
+    return (
+        VideoDownload.objects
+        .filter(status='pending')
+        .order_by('created_at', 'id')
+        .values_list('id', flat=True)
+        .first()
+    )
+
+
+def _drain_pending():
+    """Run pending downloads, oldest first, until none are left"""
+    last_id = None
+    while True:
+        download_id = _next_pending_id()
+        # download_video_thread always moves the row out of 'pending' unless
+        # the database itself is failing; don't spin on it if so
+        if download_id is None or download_id == last_id:
+            return
+        last_id = download_id
+        with _active_downloads_lock:
+            _active_downloads.add(download_id)
+        try:
+            download_video_thread(download_id)
+        finally:
+            with _active_downloads_lock:
+                _active_downloads.discard(download_id)
 
 
-def start_download(download_id):
-    """Start a download in a background thread"""
-    thread = threading.Thread(target=download_video_thread, args=(download_id,))
-    thread.daemon = True
+def _download_worker():
+    """
+    Worker thread body: drain the queue while holding one of _worker_slots
+    Re-checks the queue after giving the slot back, since a download queued
+    meanwhile may have found every slot taken
+    """
+    while True:
+        try:
+            _drain_pending()
+        finally:
+            _worker_slots.release()
+        if _next_pending_id() is None or not _worker_slots.acquire(blocking=False):
+            return
+
+
+def _run_download_worker():
+    """Thread target: run the worker and release this thread's DB connection"""
+    try:
+        _download_worker()
+    except Exception as e:
+        logger.exception(f"Error in download worker: {e}")
+    finally:
+        connection.close()
+
+
+def start_download_workers():
+    """
+    Make sure pending downloads get picked up
+    Starts a worker thread unless DOWNLOAD_WORKERS are already running, in
+    which case they claim the new rows when they finish their current ones
+    """
+    if not _worker_slots.acquire(blocking=False):
+        return None
+    thread = threading.Thread(target=_run_download_worker, name='download', daemon=True)
     thread.start()
+    return thread
+
+
+@atexit.register
+def _requeue_active_downloads():
+    """
+    Put this process's unfinished downloads back in the queue on exit
+    Worker threads are daemons, so nothing else runs the queue down at
+    shutdown; yt-dlp resumes the partial files on the next attempt
+    """
+    with _active_downloads_lock:
+        download_ids = list(_active_downloads)
+    if not download_ids:
+        return
+    try:
+        VideoDownload.objects.filter(
+            pk__in=download_ids, status__in=('fetching', 'downloading'),
+        ).update(status='pending', progress=0)
+    except Exception as e:
+        logger.error(f"Error requeueing downloads: {e}")
@@ -1,17 +1,49 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, FileResponse, Http404
+from django.http import JsonResponse, FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.conf import settings
+from django.core.cache import caches
+from django.views.decorators.cache import cache_control
 from django.views.decorators.http import require_http_methods
 from django.contrib import messages
 from pathlib import Path
+from urllib.parse import quote
+import json
 import logging
+import os
+import threading
+import time
 import uuid
 from .models import VideoDownload
-from .forms import DownloadForm
-from .utils import start_download
-from .helpers.downloader import YouTubeDownloader
+from .forms import BatchDownloadForm, DownloadForm
+from .utils import (
+    PROGRESS_CACHE_ALIAS,
+    PROGRESS_FIELDS,
+    cached_progress,
+    progress_cache_key,
+    progress_data,
+    start_download_workers,
+    wait_for_progress_change,
+)
+from .helpers.downloader import YouTubeDownloader, get_info_downloader
 
 logger = logging.getLogger(__name__)
 
+# A progress stream is closed after this long (or once nothing is active);
+# the browser reconnects after PROGRESS_STREAM_RETRY_MS. Kept short because
+# each open stream occupies a worker thread under the sync (gthread) workers
+PROGRESS_STREAM_MAX_SECONDS = 30
+PROGRESS_STREAM_RETRY_MS = 5000
+# How often a stream re-reads progress written by other worker processes
+PROGRESS_STREAM_REFRESH_SECONDS = 1.0
+
+ACTIVE_STATUSES = ('pending', 'fetching', 'downloading')
+
+# Progress streams this process will hold open at once (see settings)
+_progress_stream_slots = threading.BoundedSemaphore(settings.PROGRESS_STREAM_MAX_CONNECTIONS)
+
+# Read size when Django streams a file itself (FileResponse defaults to 4 KiB)
+FILE_BLOCK_SIZE = 1024 * 1024
+
 
 def get_or_create_session_id(request):
     """Get or create a unique session ID for the user"""
@@ -20,6 +52,14 @@ def get_or_create_session_id(request):
     return request.session['downloader_session_id']
 
 
+def get_session_id(request):
+    """
+    Get the user's session ID without creating one
+    Read-only, so polling endpoints never cause a session write
+    """
+    return request.session.get('downloader_session_id')
+
+
 def index(request):
     """Main page with download form and recent downloads"""
     session_id = get_or_create_session_id(request)
@@ -31,7 +71,7 @@ def index(request):
             download.session_id = session_id
             download.save()
             # Start download in background thread
-            start_download(download.id)
+            start_download_workers()
             messages.success(request, 'Download started successfully!')
             return redirect('web_downloader:index')
         else:
@@ -41,7 +81,14 @@ def index(request):
         form = DownloadForm()
     
     # Get only this user's downloads
-    recent_downloads = VideoDownload.objects.filter(session_id=session_id)[:20]
+    recent_downloads = list(
+        VideoDownload.objects
+        .only('id', 'title', 'duration', 'file_size', 'status', 'progress')
+        .filter(session_id=session_id)[:20]
+    )
+    # Downloads queued by a worker process that has since exited
+    if any(download.status == 'pending' for download in recent_downloads):
+        start_download_workers()
     
     context = {
         'form': form,
@@ -51,6 +98,21 @@ def index(request):
     return render(request, 'web_downloader/index.html', context)
 
 
+@require_http_methods(["POST"])
+def start_batch(request):
+    """API endpoint to start downloads for several URLs (e.g. playlist videos) at once"""
+    session_id = get_or_create_session_id(request)
+    form = BatchDownloadForm(request.POST)
+    if not form.is_valid():
+        errors = [error for field_errors in form.errors.values() for error in field_errors]
+        return JsonResponse({'error': errors[0], 'errors': form.errors}, status=400)
+    
+    downloads = form.save_many(session_id)
+    start_download_workers()
+    
+    return JsonResponse({'success': True, 'ids': [download.id for download in downloads]})
+
+
 def preview(request):
     """Preview page to show video details before downloading"""
     url = request.GET.get('url', '').strip()
@@ -60,16 +122,19 @@ def preview(request):
         return redirect('web_downloader:index')
     
     # Validate URL
-    is_valid, error_message = YouTubeDownloader.validate_url(url)
+    is_valid, video_id, error_message = YouTubeDownloader.validate_and_extract(url)
     if not is_valid:
         return render(request, 'web_downloader/error.html', {
             'error_title': 'Invalid URL',
             'error_message': error_message,
         })
     
+    # Drop cached metadata when the user asks for a refresh
+    if request.GET.get('refresh') and video_id:
+        YouTubeDownloader.invalidate(video_id)
+    
     # Fetch video info
-    downloader = YouTubeDownloader()
-    video_info = downloader.get_video_info(url)
+    video_info = get_info_downloader().get_video_info(url, video_id=video_id)
     
     if not video_info:
         return render(request, 'web_downloader/error.html', {
@@ -89,26 +154,84 @@ def preview(request):
 
 
 @require_http_methods(["GET"])
+@cache_control(no_store=True)
 def get_progress(request, download_id):
     """API endpoint to get download progress"""
-    session_id = get_or_create_session_id(request)
-    try:
-        # Only allow access to user's own downloads
-        download = VideoDownload.objects.get(id=download_id, session_id=session_id)
-        data = {
-            'id': download.id,
-            'title': download.title or 'Processing...',
-            'status': download.status,
-            'progress': download.progress,
-            'error_message': download.error_message,
-            'file_available': bool(download.file_path and download.status == 'completed'),
-            'thumbnail': download.thumbnail,
-            'duration': download.duration_formatted,
-            'format_type': download.format_type,
-        }
-        return JsonResponse(data)
-    except VideoDownload.DoesNotExist:
+    session_id = get_session_id(request)
+    if not session_id:
         return JsonResponse({'error': 'Download not found'}, status=404)
+    
+    # Running downloads publish their latest progress to the cache
+    cached = caches[PROGRESS_CACHE_ALIAS].get(progress_cache_key(download_id))
+    if cached and cached['session_id'] == session_id:
+        return JsonResponse(cached['data'])
+    
+    # Only allow access to user's own downloads
+    row = (
+        VideoDownload.objects
+        .filter(id=download_id, session_id=session_id)
+        .values(*PROGRESS_FIELDS)
+        .first()
+    )
+    if row is None:
+        return JsonResponse({'error': 'Download not found'}, status=404)
+    return JsonResponse(progress_data(row))
+
+
+def _progress_events(session_id):
+    """
+    Yield Server-Sent Events with the progress of a session's downloads
+    Sends a snapshot whenever it changes; ends when nothing is active or
+    after PROGRESS_STREAM_MAX_SECONDS
+    """
+    yield f"retry: {PROGRESS_STREAM_RETRY_MS}\n\n"
+    
+    deadline = time.monotonic() + PROGRESS_STREAM_MAX_SECONDS
+    last_payload = None
+    while True:
+        rows = VideoDownload.objects.filter(session_id=session_id).values(*PROGRESS_FIELDS)[:20]
+        snapshot = cached_progress(rows)
+        payload = json.dumps(snapshot)
+        if payload != last_payload:
+            yield f"data: {payload}\n\n"
+            last_payload = payload
+        
+        if time.monotonic() >= deadline:
+            break
+        if not any(item['status'] in ACTIVE_STATUSES for item in snapshot):
+            break
+        wait_for_progress_change(PROGRESS_STREAM_REFRESH_SECONDS)
+
+
+class ProgressStreamResponse(StreamingHttpResponse):
+    """Event stream that gives back its stream slot when the server closes it"""
+    
+    def close(self):
+        try:
+            super().close()
+        finally:
+            if getattr(self, 'holds_slot', False):
+                self.holds_slot = False
+                _progress_stream_slots.release()
+
+
+@require_http_methods(["GET"])
+def progress_stream(request):
+    """Server-Sent Events endpoint pushing progress for all of the user's downloads"""
+    session_id = get_session_id(request)
+    if not session_id:
+        # 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    
+    # Over the cap the page falls back to polling get_progress
+    if not _progress_stream_slots.acquire(blocking=False):
+        return HttpResponse(status=204)
+    
+    response = ProgressStreamResponse(_progress_events(session_id), content_type='text/event-stream')
+    response.holds_slot = True
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
 
 
 @require_http_methods(["GET"])
@@ -119,21 +242,26 @@ def get_video_info(request):
     if not url:
         return JsonResponse({'error': 'URL is required'}, status=400)
     
-    is_valid, error_message = YouTubeDownloader.validate_url(url)
+    is_valid, video_id, error_message = YouTubeDownloader.validate_and_extract(url)
     if not is_valid:
         return JsonResponse({'error': error_message}, status=400)
     
-    downloader = YouTubeDownloader()
+    downloader = get_info_downloader()
     
     # Check if it's a playlist URL
     if YouTubeDownloader.is_playlist_url(url):
+        playlist_id = YouTubeDownloader.extract_playlist_id(url)
+        if request.GET.get('refresh') and playlist_id:
+            YouTubeDownloader.invalidate_playlist(playlist_id)
         playlist_info = downloader.get_playlist_info(url)
         if playlist_info:
             return JsonResponse(playlist_info)
         else:
             return JsonResponse({'error': 'Could not fetch playlist information'}, status=404)
     else:
-        video_info = downloader.get_video_info(url)
+        if request.GET.get('refresh') and video_id:
+            YouTubeDownloader.invalidate(video_id)
+        video_info = downloader.get_video_info(url, video_id=video_id)
         if video_info:
             video_info['is_playlist'] = False
             return JsonResponse(video_info)
@@ -144,7 +272,7 @@ def get_video_info(request):
 @require_http_methods(["GET"])
 def download_file(request, download_id):
     """Serve the downloaded file to the user"""
-    session_id = get_or_create_session_id(request)
+    session_id = get_session_id(request)
     # Only allow access to user's own downloads
     download = get_object_or_404(VideoDownload, id=download_id, session_id=session_id)
     
@@ -152,34 +280,61 @@ def download_file(request, download_id):
         raise Http404("File not available")
     
     file_path = Path(download.file_path)
-    if not file_path.exists():
-        raise Http404("File not found on disk")
     
     # Determine content type based on format
     content_type = 'audio/mpeg' if download.format_type == 'mp3' else 'video/mp4'
     
-    response = FileResponse(open(file_path, 'rb'), content_type=content_type)
-    response['Content-Disposition'] = f'attachment; filename="{file_path.name}"'
+    accel_prefix = settings.DOWNLOAD_ACCEL_REDIRECT_PREFIX
+    if accel_prefix:
+        try:
+            relative_path = file_path.relative_to(settings.DOWNLOAD_ROOT)
+        except ValueError:
+            relative_path = None
+        if relative_path is not None:
+            # Let the reverse proxy send the file (and 404 if it's gone);
+            # Django only sets headers
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(relative_path.as_posix())
+            response['Content-Disposition'] = f'attachment; filename="{file_path.name}"'
+            return response
+    
+    # open() does the existence check; no separate stat
+    try:
+        file_handle = open(file_path, 'rb', buffering=FILE_BLOCK_SIZE)
+    except FileNotFoundError:
+        raise Http404("File not found on disk")
+    
+    response = FileResponse(
+        file_handle,
+        content_type=content_type,
+        as_attachment=True,
+        filename=file_path.name,
+    )
+    response.block_size = FILE_BLOCK_SIZE
     return response
 
 
 @require_http_methods(["POST"])
 def delete_download(request, download_id):
     """Delete a download record and optionally its file"""
-    session_id = get_or_create_session_id(request)
+    session_id = get_session_id(request)
     # Only allow deletion of user's own downloads
-    download = get_object_or_404(VideoDownload, id=download_id, session_id=session_id)
+    downloads = VideoDownload.objects.filter(id=download_id, session_id=session_id)
+    file_path = downloads.values_list('file_path', flat=True).first()
+    if file_path is None:
+        raise Http404("Download not found")
+    
+    downloads.delete()
+    caches[PROGRESS_CACHE_ALIAS].delete(progress_cache_key(download_id))
     
     # Delete the file if it exists
-    if download.file_path:
-        file_path = Path(download.file_path)
-        if file_path.exists():
-            try:
-                file_path.unlink()
-            except Exception as e:
-                logger.error(f"Error deleting file: {e}")
-    
-    download.delete()
+    if file_path:
+        try:
+            os.unlink(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error deleting file: {e}")
     
     # Check if this is an AJAX request
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 import os
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -91,6 +93,44 @@ DATABASES = {
     }
 }
 
+# In WAL mode a transaction that reads before it writes fails at once with
+# "database is locked" if another connection wrote in between (the busy
+# timeout doesn't apply to that upgrade). Take the write lock when the
+# transaction begins instead; the option exists from Django 5.1
+if django.VERSION >= (5, 1):
+    DATABASES['default']['OPTIONS']['transaction_mode'] = 'IMMEDIATE'
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Video metadata is kept on disk so it survives restarts and is shared by all workers
+CACHE_DIR = os.environ.get('CACHE_DIR', str(BASE_DIR / '.cache'))
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'video_info': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'yt_meta'),
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Latest progress of running downloads, shared by all worker processes.
+    # Only live downloads have entries (finished ones are deleted), so the cap
+    # stays small: every set() lists the whole directory to check it
+    'progress': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, 'progress'),
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 500,
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -136,6 +176,24 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'downloads'
 
+# Finished downloads are kept per session under DOWNLOAD_ROOT and reused for
+# repeat requests; least recently used files are evicted above the size cap
+DOWNLOAD_ROOT = os.environ.get('DOWNLOAD_ROOT', str(MEDIA_ROOT))
+DOWNLOAD_CACHE_MAX_BYTES = int(os.environ.get('DOWNLOAD_CACHE_MAX_BYTES', 10 * 1024 ** 3))
+
+# Downloads run concurrently per process; further requests wait as 'pending'
+DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 4))
+
+# Progress streams (Server-Sent Events) held open at once per process. Each
+# one occupies a worker thread, so keep this below the gunicorn --threads
+# count; further clients are told to poll instead
+PROGRESS_STREAM_MAX_CONNECTIONS = int(os.environ.get('PROGRESS_STREAM_MAX_CONNECTIONS', 4))
+
+# When set (e.g. '/internal-downloads/'), finished files are handed to the
+# reverse proxy with X-Accel-Redirect instead of being streamed by Django.
+# The prefix must be an nginx 'internal' location aliased to DOWNLOAD_ROOT.
+DOWNLOAD_ACCEL_REDIRECT_PREFIX = os.environ.get('DOWNLOAD_ACCEL_REDIRECT_PREFIX', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 